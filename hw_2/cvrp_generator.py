@@ -1,75 +1,248 @@
 """
     This script is a generator for CVRP problems
 
-    User can call the module with two ways:
-    1: python3 cvrp_generator.py <dimension> <capacity> <file_name>
+    User can call the module with three ways:
+    1: python3 cvrp_generator.py <dimension> <capacity> <file_name> [<customer_layout> <depot_position>]
     2: python3 cvrp_generator.py
+    3: python3 cvrp_generator.py suite <output_dir> <dimensions> <tightness_ratios> <master_seed> [<customer_layouts>]
+       where dimensions, tightness_ratios and customer_layouts are comma separated lists
 
     If user selects the second way, we ask him to give these values
+
+    The third way generates a benchmark suite: one instance for each combination of the given values, in parallel.
+    Each instance gets its own seed derived from the master seed and all parameters are written to
+    <output_dir>/manifest.json, so regenerate_suite(manifest_file) recreates the exact same files.
+
+    Like the X set of Uchoa et al, customers can be placed randomly ('random'), around a few cluster seeds
+    ('clustered') or half and half ('random_clustered'). The depot (node 1) can be 'central', 'eccentric'
+    (corner of the grid) or 'random'. All coords are unique and are sampled in bulk with numpy, and the file is
+    written in chunks, so instances with millions of customers need neither python loops nor the whole text in RAM.
 """
-import random
+import hashlib
+import json
+import math
+import os
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
 
-random.seed(int(time.time()))
+import numpy as np
 
+CUSTOMER_LAYOUTS = ('random', 'clustered', 'random_clustered')
+DEPOT_POSITIONS = ('random', 'central', 'eccentric')
+DEMAND_UPPER_BOUND = 10
+# rows written to the file at once
+CHUNK_SIZE = 100000
+# average number of customers per truck in suite instances, it sets the number of trucks
+SUITE_ROUTE_SIZE = 10
+MANIFEST_FILE = 'manifest.json'
 
-def generate_data(dimension, capacity, file_name):
+
+def generate_data(dimension, capacity, file_name, customer_layout='random', depot_position='random', seed=None):
+    rng = np.random.default_rng(int(time.time()) if seed is None else seed)
     header_data = create_header(dimension, capacity, file_name)
-    nodes_data = generate_nodes(dimension)
-    nodes_demands = generate_demand_data(dimension)
-    depot_section = str(random.randint(1, dimension))
+    nodes_data = generate_nodes(dimension, rng, customer_layout, depot_position)
+    nodes_demands = generate_demand_data(dimension, rng)
+    depot_section = '1'
     write_data_to_file(header_data, nodes_data, nodes_demands, depot_section, file_name)
 
 
-def write_data_to_file(header, nodes, demands, depot, file_name):
-    data_to_write = '\n'.join(header) + '\nNODE_COORD_SECTION\n'
+def generate_suite_instance(parameters):
+    """
+    :param parameters: dict, one manifest entry
+    :return: string, sha1 of the written file
+
+    Trucks are set from the number of customers (SUITE_ROUTE_SIZE customers per truck) and the capacity from the
+    tightness ratio, i.e. total demand / (trucks * capacity).
+    """
+    rng = np.random.default_rng(parameters['seed'])
+    dimension = parameters['dimension']
+    nodes_data = generate_nodes(dimension, rng, parameters['customer_layout'], parameters['depot_position'])
+    nodes_demands = generate_demand_data(dimension, rng)
+    num_of_trucks = max(math.ceil((dimension - 1) / SUITE_ROUTE_SIZE), 1)
+    capacity = max(math.ceil(nodes_demands.sum() / (parameters['tightness'] * num_of_trucks)),
+                   int(nodes_demands.max()))
+    file_name = os.path.join(parameters['output_dir'], parameters['name'])
+    header_data = create_header(dimension, capacity, parameters['name'], num_of_trucks)
+    write_data_to_file(header_data, nodes_data, nodes_demands, '1', file_name)
+
+    with open(file_name + '.vrp', 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
 
-    for node_id, coords in nodes.items():
-        data_to_write += '{}\t{}\t{}\n'.format(node_id, coords[0], coords[1])
-    data_to_write += 'DEMAND_SECTION\n'
+def generate_suite(output_dir, dimensions, tightness_ratios, master_seed, customer_layouts=('random',),
+                   depot_position='random', processes=None):
+    """
+    :return: dict, the manifest
 
-    for node_id, demand in demands.items():
-        data_to_write += '{}\t{}\n'.format(node_id, demand)
-    data_to_write += 'DEPOT_SECTION\n' + '{}\n-1\nEOF'.format(depot)
+    Generate one instance for each (dimension, tightness ratio, customer layout) in a process pool.
+    Instance seeds come from np.random.SeedSequence(master_seed), so they do not depend on the process
+    that generates each instance.
+    """
+    grid = list(product(dimensions, tightness_ratios, customer_layouts))
+    seeds = np.random.SeedSequence(master_seed).generate_state(len(grid), dtype=np.uint64).tolist()
+    instances = []
+    for (dimension, tightness, customer_layout), seed in zip(grid, seeds):
+        instances.append({
+            'name': 'cvrp_n{}_t{}_{}_s{}'.format(dimension, tightness, customer_layout, seed),
+            'dimension': dimension,
+            'tightness': tightness,
+            'customer_layout': customer_layout,
+            'depot_position': depot_position,
+            'seed': seed
+        })
+    manifest = {
+        'master_seed': master_seed,
+        'numpy_version': np.__version__,
+        'instances': instances
+    }
+    return run_suite(output_dir, manifest, processes)
 
-    with open(file_name + '.vrp.', 'w') as f:
-        f.write(data_to_write)
+
+def regenerate_suite(manifest_file, output_dir=None, processes=None):
+    """ Recreate all instances of a manifest. The file hashes show if a file is not the same bit for bit """
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    previous_hashes = [instance.pop('sha1', None) for instance in manifest['instances']]
+    manifest = run_suite(output_dir or os.path.dirname(manifest_file), manifest, processes)
+    for instance, previous_hash in zip(manifest['instances'], previous_hashes):
+        if previous_hash and instance['sha1'] != previous_hash:
+            print("File {} is not the same as the one in the manifest".format(instance['name']))
+    return manifest
+
+
+def run_suite(output_dir, manifest, processes=None):
+    os.makedirs(output_dir, exist_ok=True)
+    parameters = [dict(instance, output_dir=output_dir) for instance in manifest['instances']]
+    with ProcessPoolExecutor(processes) as executor:
+        file_hashes = list(executor.map(generate_suite_instance, parameters))
+    for instance, file_hash in zip(manifest['instances'], file_hashes):
+        instance['sha1'] = file_hash
+
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def write_data_to_file(header, nodes, demands, depot, file_name):
+    node_ids = np.arange(1, len(nodes) + 1)
+    with open(file_name + '.vrp', 'w') as f:
+        f.write('\n'.join(header) + '\nNODE_COORD_SECTION\n')
+        write_rows(f, np.column_stack((node_ids, nodes)))
+        f.write('DEMAND_SECTION\n')
+        write_rows(f, np.column_stack((node_ids, demands)))
+        f.write('DEPOT_SECTION\n' + '{}\n-1\nEOF'.format(depot))
 
 
-def generate_demand_data(dimension):
-    demand_upper_bound = 10
-    nodes_demands = {}
-    for node_id in range(1, dimension + 1):
-        nodes_demands[node_id] = random.randint(1, demand_upper_bound)
+def write_rows(f, rows):
+    # one format string per chunk is much faster than np.savetxt, which formats row by row
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        row_format = '\t'.join(['%d'] * chunk.shape[1]) + '\n'
+        f.write((row_format * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+def generate_demand_data(dimension, rng):
+    nodes_demands = rng.integers(1, DEMAND_UPPER_BOUND, size=dimension, endpoint=True)
+    nodes_demands[0] = 0  # depot
     return nodes_demands
 
 
-def generate_nodes(dimension):
-    nodes = {}
-    seen_nodes = set()
+def coords_upper_bound_of(dimension):
+    # keep the grid at least twice the number of nodes, so few sampled coords are rejected as duplicates
     coords_upper_bound = 2000
-
-    while coords_upper_bound ** 2 < dimension:
+    while (coords_upper_bound + 1) ** 2 < 2 * dimension:
         coords_upper_bound += dimension
+    return coords_upper_bound
+
+
+def sample_customers(count, rng, customer_layout, coords_upper_bound, cluster_seeds, cluster_spread):
+    if customer_layout == 'random':
+        return rng.integers(0, coords_upper_bound, size=(count, 2), endpoint=True)
+    if customer_layout == 'clustered':
+        centers = cluster_seeds[rng.integers(0, len(cluster_seeds), size=count)]
+        coords = np.rint(centers + rng.normal(0, cluster_spread, size=(count, 2)))
+        # reflect coords that fell out of the grid, clipping would pile them up on its edges
+        coords = np.mod(coords, 2 * coords_upper_bound)
+        return (coords_upper_bound - np.abs(coords_upper_bound - coords)).astype(np.int64)
+    # random_clustered
+    clustered_count = count // 2
+    return np.concatenate((
+        sample_customers(clustered_count, rng, 'clustered', coords_upper_bound, cluster_seeds, cluster_spread),
+        sample_customers(count - clustered_count, rng, 'random', coords_upper_bound, cluster_seeds, cluster_spread)
+    ))
+
+
+def generate_nodes(dimension, rng, customer_layout='random', depot_position='random'):
+    """
+    :return: numpy.ndarray
 
-    for node_id in range(1, dimension + 1):
-        x, y = random.randint(0, coords_upper_bound), random.randint(0, coords_upper_bound)
-        while (x, y) in seen_nodes:  # create unique coords pairs
-            x, y = random.randint(0, dimension), random.randint(0, dimension)
-        seen_nodes.add((x, y))
-        nodes[node_id] = x, y
+    Return (dimension, 2) unique integer coords. Row 0 is the depot.
+    """
+    if customer_layout not in CUSTOMER_LAYOUTS:
+        raise ValueError("Customer layout must be one of {}".format(', '.join(CUSTOMER_LAYOUTS)))
+    if depot_position not in DEPOT_POSITIONS:
+        raise ValueError("Depot position must be one of {}".format(', '.join(DEPOT_POSITIONS)))
+    coords_upper_bound = coords_upper_bound_of(dimension)
 
-    return nodes
+    if depot_position == 'central':
+        depot = np.array([coords_upper_bound // 2, coords_upper_bound // 2])
+    elif depot_position == 'eccentric':
+        depot = np.array([0, 0])
+    else:
+        depot = rng.integers(0, coords_upper_bound, size=2, endpoint=True)
 
+    cluster_seeds = rng.integers(0, coords_upper_bound, size=(rng.integers(3, 8, endpoint=True), 2), endpoint=True)
+    # clusters get wider with the dimension, so they never run out of free coords
+    cluster_spread = coords_upper_bound / 40 + np.sqrt(dimension)
+    # coords are kept as single integers (x * (upper_bound + 1) + y), so duplicates are found with np.unique
+    width = coords_upper_bound + 1
+    accepted = np.array([depot[0] * width + depot[1]])
+    acceptance_rate = 1.0
+    while len(accepted) < dimension:
+        missing = dimension - len(accepted)
+        sample_size = int(missing / acceptance_rate * 1.1) + 10
+        sampled = sample_customers(sample_size, rng, customer_layout, coords_upper_bound, cluster_seeds,
+                                   cluster_spread)
+        candidates = np.concatenate((accepted, sampled[:, 0] * width + sampled[:, 1]))
+        # keep the first appearance of each coords pair, in sampling order
+        _, first_indexes = np.unique(candidates, return_index=True)
+        acceptance_rate = max((len(first_indexes) - len(accepted)) / sample_size, 0.01)
+        accepted = candidates[np.sort(first_indexes)][:dimension]
 
-def create_header(dimension, capacity, file_name):
+    return np.column_stack((accepted // width, accepted % width))
+
+
+def create_header(dimension, capacity, file_name, num_of_trucks=None):
     header_data = ['NAME: ' + file_name, 'TYPE: CVRP', 'DIMENSION: %d' % dimension, 'CAPACITY: %d' % capacity]
+    if num_of_trucks:
+        # same format as CVRPLIB comments, so vrp_parser finds the number of trucks
+        header_data.insert(1, 'COMMENT: (cvrp_generator, No of trucks: %d)' % num_of_trucks)
     return header_data
 
 
+def suite_main():
+    arg_names = ['command', 'suite', 'output_dir', 'dimensions', 'tightness_ratios', 'master_seed', 'customer_layouts']
+    users_args = dict(zip(arg_names, sys.argv))
+    if 'master_seed' not in users_args:
+        print("In order to run: python3 cvrp_generator.py suite <output_dir> <dimensions> <tightness_ratios> "
+              "<master_seed> [<customer_layouts>]")
+        return
+    manifest = generate_suite(users_args['output_dir'],
+                              [int(value) for value in users_args['dimensions'].split(',')],
+                              [float(value) for value in users_args['tightness_ratios'].split(',')],
+                              int(users_args['master_seed']),
+                              users_args.get('customer_layouts', 'random').split(','))
+    print("{} instances have been written to '{}'".format(len(manifest['instances']), users_args['output_dir']))
+
+
 def main():
-    arg_names = ['command', 'dimension', 'capacity', 'file_name']
+    if len(sys.argv) > 1 and sys.argv[1] == 'suite':
+        suite_main()
+        return
+
+    arg_names = ['command', 'dimension', 'capacity', 'file_name', 'customer_layout', 'depot_position']
     users_args = dict(zip(arg_names, sys.argv))
 
     if 'dimension' not in users_args:
@@ -93,7 +266,8 @@ def main():
     if 'file_name' not in users_args:
         users_args['file_name'] = 'cvrp_{}_{}'.format(users_args['dimension'], users_args['capacity'])
 
-    generate_data(int(users_args['dimension']), int(users_args['capacity']), users_args['file_name'])
+    generate_data(int(users_args['dimension']), int(users_args['capacity']), users_args['file_name'],
+                  users_args.get('customer_layout', 'random'), users_args.get('depot_position', 'random'))
 
 
 if __name__ == '__main__':
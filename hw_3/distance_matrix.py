@@ -0,0 +1,153 @@
+"""
+    Distance matrix for CVRP instances. All distances are calculated once per instance with numpy broadcasting
+    and stored in a dense array, so heuristics make an O(1) indexed lookup instead of recalculating distances.
+
+    Supported EDGE_WEIGHT_TYPE values follow the TSPLIB/CVRPLIB conventions:
+    EUC_2D   - euclidean distance rounded to the nearest integer (all files from CVRPLIB)
+    MAN_2D   - manhattan distance rounded to the nearest integer (files without EDGE_WEIGHT_TYPE, e.g. hw_2 files)
+    EXACT_2D - euclidean distance without rounding
+
+    A dense matrix needs 4 * n^2 bytes, so for instances over DENSE_MATRIX_LIMIT nodes the matrix values are
+    CoordinateDistances, which support the same indexing but calculate each distance from the coords when asked.
+"""
+import os
+
+import numpy as np
+
+EUC_2D = 'EUC_2D'
+MAN_2D = 'MAN_2D'
+EXACT_2D = 'EXACT_2D'
+DEFAULT_EDGE_WEIGHT_TYPE = MAN_2D
+
+# rows calculated at once, so temporary arrays stay small for big instances
+BLOCK_SIZE = 1024
+# 10000 nodes need a 400MB matrix
+DENSE_MATRIX_LIMIT = 10000
+
+
+def nint(values):
+    # TSPLIB rounding (0.5 goes up). np.rint would round 0.5 to the nearest even number
+    return np.floor(values + 0.5)
+
+
+def calculate_distances(x, y, edge_weight_type=DEFAULT_EDGE_WEIGHT_TYPE):
+    """
+    :param x: array like with x coords
+    :param y: array like with y coords
+    :param edge_weight_type: string
+    :return: numpy.ndarray
+
+    Return the (n, n) distance matrix. Rounded types are stored as int32, EXACT_2D as float32.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    distances = np.empty((len(x), len(x)), dtype=distance_dtype(edge_weight_type))
+
+    for start in range(0, len(x), BLOCK_SIZE):
+        end = min(start + BLOCK_SIZE, len(x))
+        distances[start:end] = edge_weights(x[start:end, np.newaxis] - x[np.newaxis, :],
+                                            y[start:end, np.newaxis] - y[np.newaxis, :], edge_weight_type)
+    return distances
+
+
+def distance_dtype(edge_weight_type):
+    if edge_weight_type not in (EUC_2D, MAN_2D, EXACT_2D):
+        raise ValueError("EDGE_WEIGHT_TYPE %s is not supported" % edge_weight_type)
+    return np.float32 if edge_weight_type == EXACT_2D else np.int32
+
+
+def edge_weights(dx, dy, edge_weight_type):
+    if edge_weight_type == MAN_2D:
+        return nint(np.abs(dx) + np.abs(dy))
+    if edge_weight_type == EUC_2D:
+        return nint(np.hypot(dx, dy))
+    return np.hypot(dx, dy)
+
+
+class CoordinateDistances:
+    """
+        Read only stand-in for a dense distance matrix of big instances. values[i, j] with ints or index arrays,
+        values[i] (a whole row) and values.item(i, j) work like numpy, but distances are calculated from coords.
+    """
+
+    def __init__(self, x, y, edge_weight_type=DEFAULT_EDGE_WEIGHT_TYPE):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.edge_weight_type = edge_weight_type
+        self.dtype = np.dtype(distance_dtype(edge_weight_type))
+        self.shape = (len(self.x), len(self.x))
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        from_nodes, to_nodes = key
+        if isinstance(from_nodes, slice):
+            from_nodes = np.arange(len(self.x))[from_nodes]
+        if isinstance(to_nodes, slice):
+            to_nodes = np.arange(len(self.x))[to_nodes]
+        weights = edge_weights(self.x[from_nodes] - self.x[to_nodes], self.y[from_nodes] - self.y[to_nodes],
+                               self.edge_weight_type)
+        return np.asarray(weights).astype(self.dtype)
+
+    def item(self, from_node, to_node):
+        return self[from_node, to_node].item()
+
+
+class DistanceMatrix:
+    """ Distances between all nodes of an instance. Nodes are the 0..n-1 indexes of vrp_parser.CVRPInstance """
+
+    def __init__(self, values, edge_weight_type=DEFAULT_EDGE_WEIGHT_TYPE):
+        self.edge_weight_type = edge_weight_type
+        self.values = values
+
+    @classmethod
+    def from_coords(cls, x, y, edge_weight_type=DEFAULT_EDGE_WEIGHT_TYPE):
+        return cls(calculate_distances(x, y, edge_weight_type), edge_weight_type)
+
+    @classmethod
+    def from_instance(cls, instance):
+        """ For cached instances the matrix is saved next to the instance arrays and memory mapped on next runs """
+        if len(instance) > DENSE_MATRIX_LIMIT:
+            return cls(CoordinateDistances(instance.x, instance.y, instance.edge_weight_type),
+                       instance.edge_weight_type)
+        if instance.cache_path is None:
+            return cls.from_coords(instance.x, instance.y, instance.edge_weight_type)
+
+        file_name = os.path.join(instance.cache_path, 'distances_%s.npy' % instance.edge_weight_type)
+        if not os.path.exists(file_name):
+            temp_file_name = '{}.tmp{}.npy'.format(file_name[:-4], os.getpid())
+            np.save(temp_file_name, calculate_distances(instance.x, instance.y, instance.edge_weight_type))
+            os.replace(temp_file_name, file_name)
+        return cls(np.load(file_name, mmap_mode='r'), instance.edge_weight_type)
+
+    def __len__(self):
+        return len(self.values)
+
+    def distance(self, from_node, to_node):
+        return self.values.item(from_node, to_node)
+
+    def route_cost(self, route):
+        """ Return the cost of a path given as a sequence of node indexes """
+        route = np.asarray(route, dtype=np.intp)
+        return self.values[route[:-1], route[1:]].sum().item()
+
+    def sequence_costs(self, sequences, depot=None):
+        """
+        :param sequences: array like (B, L) of node indexes, B candidate orders of a route
+        :param depot: int or None, if given every sequence starts and ends at the depot
+        :return: numpy array with the B costs
+
+        All costs are calculated with one gather and sum, so thousands of candidate orders (shuffles, perturbations,
+        samples) cost one numpy call instead of a python loop per candidate.
+        """
+        sequences = np.asarray(sequences, dtype=np.intp)
+        values = self.values
+        sum_dtype = np.result_type(values.dtype, np.int64)
+        costs = values[sequences[:, :-1], sequences[:, 1:]].sum(axis=1, dtype=sum_dtype)
+        if depot is not None and sequences.shape[1]:
+            costs += values[depot, sequences[:, 0]]
+            costs += values[sequences[:, -1], depot]
+        return costs
@@ -0,0 +1,132 @@
+"""
+    Uniform grid over the node coords, used by the construction heuristics to find the k nearest unserved
+    customers without scanning all nodes. Served customers are removed lazily: they are only marked inactive
+    and skipped while searching, so removal is O(1).
+"""
+import numpy as np
+
+from distance_matrix import MAN_2D
+
+# average number of nodes per grid cell
+POINTS_PER_CELL = 2
+# when the search has to look at more than this share of the cells, all active nodes are checked at once
+BRUTE_FORCE_SHARE = 0.25
+
+
+class GridIndex:
+    def __init__(self, x, y, active, edge_weight_type):
+        """
+        :param x: numpy array with x coords
+        :param y: numpy array with y coords
+        :param active: bool numpy array, nodes that can be returned (e.g. customers with demand)
+        :param edge_weight_type: string, manhattan or euclidean distances are used to rank the nodes
+        """
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.manhattan = edge_weight_type == MAN_2D
+        self.active = np.array(active, dtype=bool)
+
+        self.min_x, self.min_y = self.x.min(), self.y.min()
+        width = max(self.x.max() - self.min_x, self.y.max() - self.min_y, 1.0)
+        self.cells_per_side = max(int(np.sqrt(len(self.x) / POINTS_PER_CELL)), 1)
+        self.cell_size = width / self.cells_per_side
+        self.cells_per_side += 1  # the max coords fall on one extra cell
+
+        # nodes sorted by cell, the nodes of cell c are cell_nodes[cell_start[c]:cell_start[c + 1]]
+        cells = self.cell_of(self.x, self.y)
+        self.cell_nodes = np.argsort(cells, kind='stable')
+        self.cell_start = np.zeros(self.cells_per_side ** 2 + 1, dtype=np.intp)
+        np.cumsum(np.bincount(cells, minlength=self.cells_per_side ** 2), out=self.cell_start[1:])
+        self.active_count = int(self.active.sum())
+
+    def cell_of(self, x, y):
+        column = ((x - self.min_x) // self.cell_size).astype(np.intp)
+        row = ((y - self.min_y) // self.cell_size).astype(np.intp)
+        return row * self.cells_per_side + column
+
+    def remove(self, node):
+        if self.active[node]:
+            self.active[node] = False
+            self.active_count -= 1
+
+    def square_cells(self, column, row, radius):
+        """ Return the cells whose chebyshev distance from (column, row) is up to radius """
+        columns = np.arange(max(column - radius, 0), min(column + radius, self.cells_per_side - 1) + 1)
+        rows = np.arange(max(row - radius, 0), min(row + radius, self.cells_per_side - 1) + 1)
+        return (rows[:, np.newaxis] * self.cells_per_side + columns[np.newaxis, :]).ravel()
+
+    def nodes_of_cells(self, cells):
+        starts = self.cell_start[cells]
+        lengths = self.cell_start[cells + 1] - starts
+        if not lengths.sum():
+            return np.empty(0, dtype=np.intp)
+        # positions starts[i]..starts[i] + lengths[i] - 1 of every cell, without a python loop
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self.cell_nodes[offsets + np.arange(lengths.sum())]
+
+    def distances_from(self, node, nodes):
+        dx = self.x[nodes] - self.x[node]
+        dy = self.y[nodes] - self.y[node]
+        return np.abs(dx) + np.abs(dy) if self.manhattan else np.hypot(dx, dy)
+
+    def nearest(self, node, k, demands=None, remained_capacity=None):
+        """
+        :param node: int, node to search around
+        :param k: int
+        :param demands: numpy array, used with remained_capacity to keep only the nodes that fit in a truck
+        :param remained_capacity: number, nodes must have demand up to it
+        :return: numpy array
+
+        Return up to k active nodes (node itself excluded), nearest first.
+        """
+        if self.active_count == 0:
+            return np.empty(0, dtype=np.intp)
+        column = int((self.x[node] - self.min_x) // self.cell_size)
+        row = int((self.y[node] - self.min_y) // self.cell_size)
+        cells_count = self.cells_per_side ** 2
+        # start from a square that should hold k active nodes and grow it until the k nearest are surely in it
+        radius = max(int(np.ceil(np.sqrt(k * cells_count / self.active_count) / 2)), 1)
+        while (2 * radius + 1) ** 2 <= BRUTE_FORCE_SHARE * cells_count:
+            cells = self.square_cells(column, row, radius)
+            candidates = self.feasible(node, self.nodes_of_cells(cells), demands, remained_capacity)
+            if len(candidates) < k:
+                radius *= 2
+                continue
+            nearest = self.k_nearest(node, candidates, k)
+            # nodes out of the square are at least radius * cell_size away
+            kth_distance = self.distances_from(node, nearest[-1:])[0]
+            if kth_distance <= radius * self.cell_size:
+                return nearest
+            radius = int(kth_distance // self.cell_size) + 1
+
+        candidates = self.feasible(node, np.flatnonzero(self.active), demands, remained_capacity)
+        return self.k_nearest(node, candidates, k)
+
+    def neighbor_lists(self, nodes, k):
+        """
+        :param nodes: numpy array
+        :param k: int
+        :return: numpy array (len(nodes), k)
+
+        Return the k nearest active nodes of each node, nearest first. k is reduced when there are not enough
+        active nodes.
+        """
+        k = min(k, self.active_count - 1)
+        neighbors = np.empty((len(nodes), max(k, 0)), dtype=np.intp)
+        if k > 0:
+            for row, node in enumerate(nodes.tolist()):
+                neighbors[row] = self.nearest(node, k)
+        return neighbors
+
+    def feasible(self, node, nodes, demands, remained_capacity):
+        keep = self.active[nodes] & (nodes != node)
+        if demands is not None and remained_capacity is not None:
+            keep &= demands[nodes] <= remained_capacity
+        return nodes[keep]
+
+    def k_nearest(self, node, nodes, k):
+        node_distances = self.distances_from(node, nodes)
+        if len(nodes) > k:
+            closest = np.argpartition(node_distances, k - 1)[:k]
+            nodes, node_distances = nodes[closest], node_distances[closest]
+        return nodes[np.argsort(node_distances, kind='stable')]
@@ -1,114 +1,110 @@
-import operator
+import numpy as np
 
+import fleet_size
 import vrp_parser
+from distance_matrix import DistanceMatrix
+from solution import Solution
+from spatial_index import GridIndex
 
+# only the nearest unserved customers that fit in the truck are evaluated as its next node
+NEIGHBORS_TO_EVALUATE = 32
 
-def calculate_manhattan_distance(from_node, to_note, node_coords):
-    return (abs(node_coords[from_node]['x'] - node_coords[to_note]['x']) +
-            abs(node_coords[from_node]['y'] - node_coords[to_note]['y']))
 
+def find_next_node(current_node, distances, demands, remained_capacity, spatial_index):
+    candidates = spatial_index.nearest(current_node, NEIGHBORS_TO_EVALUATE, demands, remained_capacity)
+    if not len(candidates):
+        return None
+    best_val = demands[candidates] / distances.values[current_node, candidates]
+    return candidates[np.argmax(best_val)].item()
 
-def find_next_node(current_node, node_coords, demands, truck):
-    best_val = None
-    next_node = None
-    next_node_distance = None
-    for node_id, demand in demands.items():
-        if node_id != current_node and demand and truck['remained_capacity'] > demand and \
-                (best_val is None
-                 or best_val < demand / calculate_manhattan_distance(current_node, node_id, node_coords)):
-            manhattan_distance = calculate_manhattan_distance(current_node, node_id, node_coords)
-            best_val = demand / manhattan_distance
-            next_node_distance = manhattan_distance
-            next_node = node_id
 
-    return next_node, next_node_distance
-
-
-def calculate_path_truck(first_node_to_visit, node_coords, demands, depot, truck):
-    current_node = depot
-    if demands[first_node_to_visit] != 0:
-        truck['notes_visited'].append(first_node_to_visit)
-        truck['remained_capacity'] -= demands[first_node_to_visit]
-        truck['demand_covered'] += demands[first_node_to_visit]
-        truck['distance_made'] += calculate_manhattan_distance(current_node, first_node_to_visit, node_coords)
-        demands[first_node_to_visit] = 0
+def calculate_path_truck(first_node_to_visit, solution, route_index, spatial_index):
+    demands = solution.instance.demand
+    current_node = solution.depot
+    if demands[first_node_to_visit] != 0 and not solution.is_served(first_node_to_visit):
+        solution.append(route_index, first_node_to_visit)
+        spatial_index.remove(first_node_to_visit)
         current_node = first_node_to_visit
 
-    while truck['remained_capacity']:
-        current_node, distance_made = find_next_node(current_node, node_coords, demands, truck)
+    while solution.remained_capacity(route_index):
+        current_node = find_next_node(current_node, solution.distances, demands,
+                                      solution.remained_capacity(route_index), spatial_index)
         if current_node is None:
-            current_node = truck['notes_visited'][len(truck['notes_visited']) - 1]
             break
-        truck['notes_visited'].append(current_node)
-        truck['remained_capacity'] -= demands[current_node]
-        truck['demand_covered'] += demands[current_node]
-        truck['distance_made'] += distance_made
-        demands[current_node] = 0
-
-    # return to depot
-    truck['notes_visited'].append(depot)
-    truck['distance_made'] += calculate_manhattan_distance(current_node, depot, node_coords)
-
-
-def generate_construction_heuristic(header, node_coords, demands, depot):
-    number_of_trucks = header['num_of_trucks']
-    trucks = {}
-    # calculate the distance from depot for all nodes
-    distances = []
-    for node_id, node in node_coords.items():
-        if node_id == depot:
-            continue
-        distances.append([node_id, calculate_manhattan_distance(depot, node_id, node_coords)])
-    distances.sort(key=operator.itemgetter(1))
-
-    # select first 5 nodes as first step for each truck
-    first_steps = [distances[index][0] for index in range(5)]
-    while not all(remained_demand == 0 for node_id, remained_demand in demands.items()):
-        for truck_id in range(number_of_trucks):
-            trucks[truck_id] = {
-                'remained_capacity': header['truck_capacity'],
-                'notes_visited': [depot],
-                'demand_covered': 0,
-                'distance_made': 0
-            }
-            calculate_path_truck(first_steps[truck_id], node_coords, demands, depot, trucks[truck_id])
-
-    return trucks
-
-
-def print_results(trucks):
-    total_demand = 0
-    total_distance_made = 0
-    for truck_id, truck in trucks.items():
-        total_demand += truck['demand_covered']
-        total_distance_made += truck['distance_made']
-        print("Truck {} path: {}".format(str(truck_id), ' '.join(map(str, truck['notes_visited']))))
+        solution.append(route_index, current_node)
+        spatial_index.remove(current_node)
+
+
+def generate_construction_heuristic(instance, distances):
+    """ Return a solution.Solution, or None when the instance can not be solved """
+    fleet = fleet_size.analyse_fleet(instance)
+    for message in fleet['diagnosis']:
+        print(message)
+    if len(fleet['oversized']):
+        return None
+    number_of_trucks = fleet['trucks']
+    depot = instance.depot
+    solution = Solution(instance, distances)
+    spatial_index = GridIndex(instance.x, instance.y, instance.demand > 0, instance.edge_weight_type)
+    # sort all nodes by their distance from depot
+    nodes_by_depot_distance = np.argsort(distances.values[depot], kind='stable')
+    nodes_by_depot_distance = nodes_by_depot_distance[nodes_by_depot_distance != depot]
+
+    # select the nearest nodes to the depot as first step for each truck
+    first_steps = nodes_by_depot_distance[:number_of_trucks].tolist()
+    while not solution.is_complete():
+        unserved_count = solution.unserved_count
+        for first_step in first_steps:
+            if solution.is_complete():
+                break
+            calculate_path_truck(first_step, solution, solution.add_route(), spatial_index)
+        if solution.unserved_count == unserved_count:
+            print('No truck could serve the remaining {} nodes'.format(unserved_count))
+            break
+
+    # a truck whose first step was already served may find no node that fits
+    solution.drop_empty_routes()
+    message = fleet_size.route_count_diagnosis(fleet, len(solution.routes))
+    if message:
+        print(message)
+    return solution
+
+
+def print_results(instance, solution):
+    for route_index in range(len(solution.routes)):
+        path = instance.node_ids[solution.path(route_index)]
+        print("Truck {} path: {}".format(str(route_index), ' '.join(map(str, path))))
 
+    total_distance_made = solution.total_cost()
     print("Total distance made: ", total_distance_made)
-    print('The amount of demand that we covered: ', total_demand)
+    print('The amount of demand that we covered: ', solution.total_load())
     return total_distance_made
 
 
-def check_file(node_coords):
+def check_file(instance):
     """
         This function checks if there are two nodes in the same coords. If yes, we can't use this file since
-        manhattan distance for these nodes is zero and this will raise a ZeroDivisionError at find_next_node function.
+        their distance is zero and this will raise a ZeroDivisionError at find_next_node function.
     """
-    unique_nodes = set([(coords['x'], coords['y']) for node_id, coords in node_coords.items()])
-    return len(unique_nodes) == len(node_coords)
+    unique_nodes = np.unique(np.column_stack((instance.x, instance.y)), axis=0)
+    return len(unique_nodes) == len(instance)
 
 
 def main(file_name):
-    header, node_coords, demands, depot = vrp_parser.main(file_name)
+    instance = vrp_parser.main(file_name)
     # check if file is ok
-    file_is_ok = check_file(node_coords)
+    file_is_ok = check_file(instance)
     if file_is_ok:
-        trucks = generate_construction_heuristic(header, node_coords, demands, depot)
+        distances = DistanceMatrix.from_instance(instance)
+        solution = generate_construction_heuristic(instance, distances)
+        if solution is None:
+            print("File {} can not be solved".format(file_name))
+            return None, None, None, None
 
         # print construction heuristic solution
         print('----CONSTRUCTION HEURISTIC SOLUTION----')
-        value_to_improve = print_results(trucks)
-        return header, node_coords, demands, depot, trucks, value_to_improve
+        value_to_improve = print_results(instance, solution)
+        return instance, distances, solution, value_to_improve
     else:
         print("File {} had problem so I skipped it".format(file_name))
-        return None, None, None, None, None, None
+        return None, None, None, None
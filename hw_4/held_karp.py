@@ -0,0 +1,102 @@
+"""
+    Exact order of short routes with the Held-Karp dynamic programming.
+    cost[mask, j] is the cost of the cheapest path that starts at the depot, visits the customers of mask and ends
+    at customer j. All masks with the same number of customers are calculated at once with numpy, so the python
+    loops are O(k^2) for k customers while the work is O(2^k * k^2).
+
+    The optimal order depends only on the set of customers of the route, so results are kept in an LRU cache keyed
+    by that set and a route that appears again during the search is not solved again.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from search_controller import deadline_passed
+
+# routes with more customers are not solved, the dp needs 2^k * k memory
+HELD_KARP_LIMIT = 15
+CACHE_SIZE = 10000
+
+
+def held_karp(distances, depot, customers):
+    """
+    :param distances: distance_matrix.DistanceMatrix
+    :param depot: int
+    :param customers: sequence of customers (depot not included)
+    :return: tuple (optimal order of the customers as a numpy array, its cost with the depot at both ends)
+    """
+    customers = np.asarray(customers, dtype=np.intp)
+    length = len(customers)
+    if length < 2:
+        return customers, distances.route_cost(np.concatenate(([depot], customers, [depot])))
+    nodes = np.append(customers, depot)
+    node_distances = distances.values[nodes[:, np.newaxis], nodes[np.newaxis, :]].astype(np.float64)
+    between = node_distances[:length, :length]
+
+    masks = np.arange(1 << length)
+    members = (masks[:, np.newaxis] >> np.arange(length)) & 1 == 1
+    sizes = members.sum(axis=1)
+    cost = np.full((1 << length, length), np.inf)
+    previous = np.zeros((1 << length, length), dtype=np.int8)
+    cost[1 << np.arange(length), np.arange(length)] = node_distances[length, :length]
+
+    for size in range(2, length + 1):
+        size_masks = masks[sizes == size]
+        for last in range(length):
+            last_masks = size_masks[members[size_masks, last]]
+            # paths of the mask without last, extended to last
+            candidates = cost[last_masks ^ (1 << last)] + between[:, last]
+            best = np.argmin(candidates, axis=1)
+            cost[last_masks, last] = candidates[np.arange(len(last_masks)), best]
+            previous[last_masks, last] = best
+
+    full_mask = (1 << length) - 1
+    total_costs = cost[full_mask] + node_distances[:length, length]
+    last = int(np.argmin(total_costs))
+    order = []
+    mask = full_mask
+    while mask:
+        order.append(last)
+        mask, last = mask ^ (1 << last), int(previous[mask, last])
+    return customers[order[::-1]], total_costs.min().item()
+
+
+class HeldKarpSolver:
+    def __init__(self, distances, depot, max_customers=HELD_KARP_LIMIT, cache_size=CACHE_SIZE):
+        self.distances = distances
+        self.depot = depot
+        self.max_customers = max_customers
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def solve(self, customers):
+        """ Return (optimal order, cost) of a route with these customers, or None if they are too many """
+        if len(customers) > self.max_customers:
+            return None
+        key = frozenset(np.asarray(customers).tolist())
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+        result = held_karp(self.distances, self.depot, customers)
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def improve_routes(self, solution, deadline=None):
+        """ Put every short route of the solution in its optimal order, until the deadline passes. Return the number
+        of routes changed
+        """
+        changed = 0
+        for route_index, route in enumerate(solution.routes):
+            if deadline_passed(deadline):
+                break
+            result = self.solve(route.sequence())
+            if result is not None and result[1] < route.cost - 1e-9:
+                solution.set_sequence(route_index, result[0])
+                changed += 1
+        return changed
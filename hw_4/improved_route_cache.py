@@ -0,0 +1,58 @@
+"""
+    Cache of improved routes. The improvement loop brings every route to a 2-opt/Or-opt local optimum in each step,
+    although most routes did not change since the previous step, so the search of the same node sequence is repeated
+    again and again. The result of the search (the improved route and its cost) is kept in an LRU cache of bounded
+    size, and a route that is found in it is not searched again.
+
+    First and best improvement reach different local optima, so the key is the bytes of the path together with the
+    first_improvement flag. Python hashes the bytes in C and compares them exactly, so a lookup costs a small
+    fraction of the search it saves and there are no false hits. Hits and misses are counted to measure the
+    repeated work.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+IMPROVED_ROUTE_CACHE_SIZE = 100000
+
+
+class ImprovedRouteCache:
+    def __init__(self, max_size=IMPROVED_ROUTE_CACHE_SIZE):
+        """
+        :param max_size: int, least recently used paths are dropped over it
+        """
+        self.max_size = max_size
+        self.routes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(path, first_improvement):
+        return bool(first_improvement), np.asarray(path, dtype=np.intp).tobytes()
+
+    def get(self, path, first_improvement):
+        """ Return (improved path, cost) of path, or None if it is not in the cache """
+        key = self.key(path, first_improvement)
+        result = self.routes.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.routes.move_to_end(key)
+        return result
+
+    def put(self, path, first_improvement, improved_path, cost):
+        """ Keep the result of the search of path. The improved path is a local optimum, so it is kept too """
+        for key in (self.key(path, first_improvement), self.key(improved_path, first_improvement)):
+            self.routes[key] = (improved_path, cost)
+            self.routes.move_to_end(key)
+        while len(self.routes) > self.max_size:
+            self.routes.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def print_statistics(self):
+        print('Improved route cache: {} hits, {} misses ({:.1f}% hits), {} paths kept'.format(
+            self.hits, self.misses, 100 * self.hit_rate(), len(self.routes)))
@@ -1,59 +1,72 @@
-import time
-from random import shuffle
-
 import construction_heuristic as con_heu
+import held_karp
+import inter_route
+import intra_route
+import solution_verifier
+from parallel_routes import ParallelRouteOptimizer
+from improved_route_cache import ImprovedRouteCache
+from search_controller import SearchController
+
+# the improvement stops after this many secs even if it has not reached a local optimum
+TIME_BUDGET = 100
+
+
+def local_search_step(solution, first_improvement=False, route_optimizer=None, exact_solver=None, route_cache=None,
+                      deadline=None):
+    """ Customers are moved between trucks (inter_route.py) and every truck path is improved with 2-opt and Or-opt
+    moves (intra_route.py), in parallel when a ParallelRouteOptimizer is given. Paths already improved in a previous
+    step are taken from route_cache. Short paths are then put in their optimal order when a HeldKarpSolver is given.
+    All of them stop when the deadline passes. Return False when none of them changed the solution.
+    """
+    moves = inter_route.improve_solution(solution, deadline=deadline)
+    if route_optimizer is None:
+        moves += intra_route.improve_routes(solution, first_improvement, route_cache, deadline)
+    else:
+        moves += route_optimizer.improve_routes(solution, first_improvement, route_cache, deadline)
+    if exact_solver is not None:
+        moves += exact_solver.improve_routes(solution, deadline)
+    return moves > 0
 
 
-def reorder_truck_path(truck, node_coords):
-    """ truck path's first node will be kept. The other nodes will be shuffled"""
-    best_distance = truck['distance_made']
-    # if we find 4 continuous worse paths we exit from new_path_calculation
-    counter_worse__continuous_path = 0
-    # each truck will have 1 minutes to find a better path
-    start_time = time.time()
-    while time.time() - start_time < 60 and counter_worse__continuous_path < 4:
-        temp_copy = truck['notes_visited'][2:]
-        shuffle(temp_copy)
-        potentially_new_path = [truck['notes_visited'][0]] + temp_copy
-        new_distance = 0
-        for index in range(len(potentially_new_path) - 1):
-            new_distance += con_heu.calculate_manhattan_distance(potentially_new_path[index],
-                                                                 potentially_new_path[index + 1], node_coords)
-
-        if new_distance < best_distance:
-            counter_worse__continuous_path = 0
-            best_distance = new_distance
-            truck['notes_visited'][2:] = temp_copy
-        else:
-            counter_worse__continuous_path += 1
-    truck['distance_made'] = best_distance
-
-
-def improvement_heuristic(node_coords, trucks, value_to_improve):
-    previous_best_cost = value_to_improve
-    """ We give 600 secs to this program to improve our first solution. At first, we shuffle a part of trucks' paths.
-    If this shuffling does not improve our solution, then we shuffle the whole path for each truck and then start again
-    the previous calculation (path's part shuffling.
+def improvement_heuristic(solution, first_improvement=False, time_budget=TIME_BUDGET, max_iterations=None,
+                          max_no_improvement=None, processes=None, exact_route_size=held_karp.HELD_KARP_LIMIT,
+                          route_cache=None):
+    """ Run local search steps until a local optimum or until a budget ends. Routes are improved by processes
+    workers when processes is over 1, and routes up to exact_route_size customers (0 for none) are solved exactly.
+    Improved routes are kept in route_cache (a new ImprovedRouteCache when it is None).
+    Return the SearchController, its best attribute is the best solution found.
     """
-    new_total_distance_made = 0
-    start_time = time.time()
-    while time.time() - start_time < 100:
-        for truck_id, truck in trucks.items():
-            reorder_truck_path(truck, node_coords)
-            new_total_distance_made += truck['distance_made']
+    controller = SearchController(solution, time_budget, max_iterations, max_no_improvement)
+    if route_cache is None:
+        route_cache = ImprovedRouteCache()
+    exact_solver = None
+    if exact_route_size:
+        exact_solver = held_karp.HeldKarpSolver(solution.distances, solution.depot, exact_route_size)
+    if processes is None or processes <= 1:
+        controller.run(lambda current_solution: local_search_step(current_solution, first_improvement, None,
+                                                                  exact_solver, route_cache, controller.deadline))
+        return controller
 
-        if new_total_distance_made < previous_best_cost:
-            previous_best_cost = new_total_distance_made
+    with ParallelRouteOptimizer(solution.distances, processes) as route_optimizer:
+        controller.run(lambda current_solution: local_search_step(current_solution, first_improvement,
+                                                                  route_optimizer, exact_solver, route_cache,
+                                                                  controller.deadline))
+    return controller
 
 
 def main():
     file_name = '../hw_1/A/A-n38-k5.vrp'
     # file_name = input("Give file's name\n")
-    header, node_coords, demands, depot, trucks, value_to_improve = con_heu.main(file_name)
-    if header and node_coords and demands and depot and trucks and value_to_improve:
-        improvement_heuristic(node_coords, trucks, value_to_improve)
+    instance, distances, solution, value_to_improve = con_heu.main(file_name)
+    if instance and distances and solution and value_to_improve:
+        route_cache = ImprovedRouteCache()
+        controller = improvement_heuristic(solution, route_cache=route_cache)
         print('----IMPROVEMENT HEURISTIC SOLUTION----')
-        con_heu.print_results(trucks)
+        con_heu.print_results(instance, controller.best)
+        controller.print_summary()
+        report = solution_verifier.verify(controller.best, solution_verifier.best_known_cost_of(file_name))
+        solution_verifier.print_report(instance, report)
+        route_cache.print_statistics()
 
 
 if __name__ == '__main__':
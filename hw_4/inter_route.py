@@ -0,0 +1,252 @@
+"""
+    Local search between routes. For a customer u and a customer v of another route the moves are:
+    relocate       - move u next to v (before or after it)
+    swap           - exchange u and v
+    2-opt*         - exchange the route tails so that u and v become neighbors
+    cross-exchange - exchange the segment after u with the segment that starts at v (up to CROSS_SEGMENT nodes
+                     each), so that v follows u
+
+    Only v among the INTER_ROUTE_NEIGHBORS nearest customers of u are tried (granular neighborhood), since moves
+    that connect distant customers are rarely improving. Deltas are calculated in O(1) from the changed edges, and
+    loads from the cached route loads and prefix sums of the loads of each route.
+
+    Don't look bits: a customer is searched again only when an applied move changed an edge next to it, so after
+    the first pass only the regions that changed are scanned.
+"""
+from collections import deque
+
+import numpy as np
+
+from search_controller import deadline_passed
+from solution import NOT_ASSIGNED
+from spatial_index import GridIndex
+
+INTER_ROUTE_NEIGHBORS = 10
+CROSS_SEGMENT = 3
+# deltas above -EPSILON are not improvements, so float distances do not loop on rounding errors
+EPSILON = 1e-9
+
+RELOCATE = 'relocate'
+EXCHANGE = 'exchange'
+TWO_OPT_STAR = '2-opt*'
+
+
+class InterRouteSearch:
+    def __init__(self, solution, neighbors=INTER_ROUTE_NEIGHBORS):
+        """
+        :param solution: solution.Solution, it is changed in place
+        :param neighbors: int, size of the candidate list of every customer
+        """
+        instance = solution.instance
+        self.solution = solution
+        self.values = solution.distances.values
+        self.demand = instance.demand
+        self.capacity = instance.truck_capacity
+        self.depot = instance.depot
+        self.customers = np.flatnonzero(solution.route_of != NOT_ASSIGNED)
+        spatial_index = GridIndex(instance.x, instance.y, solution.route_of != NOT_ASSIGNED, instance.edge_weight_type)
+        self.neighbor_lists = spatial_index.neighbor_lists(self.customers, neighbors)
+        self.neighbor_row = np.full(len(instance), NOT_ASSIGNED, dtype=np.intp)
+        self.neighbor_row[self.customers] = np.arange(len(self.customers))
+        # prefix sums of the loads of each route, calculated when needed and dropped when the route changes
+        self.prefix_loads = {}
+
+    def node_at(self, route_index, position):
+        route = self.solution.routes[route_index]
+        return route.nodes.item(position) if 0 <= position < route.length else self.depot
+
+    def load_before(self, route_index, position):
+        """ Load of the customers of the route before position """
+        if route_index not in self.prefix_loads:
+            prefix_loads = np.zeros(len(self.solution.routes[route_index]) + 1, dtype=np.int64)
+            np.cumsum(self.demand[self.solution.routes[route_index].sequence()], out=prefix_loads[1:])
+            self.prefix_loads[route_index] = prefix_loads
+        return self.prefix_loads[route_index].item(position)
+
+    def relocate_delta(self, node, route_index, position, to_route, to_position):
+        """ Cost change of moving node (route_index, position) in to_route before to_position """
+        distance = self.values.item
+        previous_node, next_node = self.node_at(route_index, position - 1), self.node_at(route_index, position + 1)
+        before, after = self.node_at(to_route, to_position - 1), self.node_at(to_route, to_position)
+        return (distance(before, node) + distance(node, after) - distance(before, after) -
+                distance(previous_node, node) - distance(node, next_node) + distance(previous_node, next_node))
+
+    def exchange_delta(self, route_index, start, length, other_route, other_start, other_length):
+        """ Cost change of exchanging the segments at start and other_start of two routes, kept in their direction """
+        distance = self.values.item
+        before, first = self.node_at(route_index, start - 1), self.node_at(route_index, start)
+        last, after = self.node_at(route_index, start + length - 1), self.node_at(route_index, start + length)
+        other_before, other_first = self.node_at(other_route, other_start - 1), self.node_at(other_route, other_start)
+        other_last = self.node_at(other_route, other_start + other_length - 1)
+        other_after = self.node_at(other_route, other_start + other_length)
+        return (distance(before, other_first) + distance(other_last, after) + distance(other_before, first) +
+                distance(last, other_after) - distance(before, first) - distance(last, after) -
+                distance(other_before, other_first) - distance(other_last, other_after))
+
+    def two_opt_star_delta(self, route_index, split, other_route, other_split):
+        """ Cost change of joining the head of each route (nodes before split) with the tail of the other route """
+        distance = self.values.item
+        last, first = self.node_at(route_index, split - 1), self.node_at(route_index, split)
+        other_last, other_first = self.node_at(other_route, other_split - 1), self.node_at(other_route, other_split)
+        return (distance(last, other_first) + distance(other_last, first) - distance(last, first) -
+                distance(other_last, other_first))
+
+    def exchange_fits(self, route_index, start, length, other_route, other_start, other_length):
+        segment_load = self.load_before(route_index, start + length) - self.load_before(route_index, start)
+        other_segment_load = (self.load_before(other_route, other_start + other_length) -
+                              self.load_before(other_route, other_start))
+        routes = self.solution.routes
+        return (routes[route_index].load - segment_load + other_segment_load <= self.capacity and
+                routes[other_route].load - other_segment_load + segment_load <= self.capacity)
+
+    def two_opt_star_fits(self, route_index, split, other_route, other_split):
+        head_load, other_head_load = self.load_before(route_index, split), self.load_before(other_route, other_split)
+        routes = self.solution.routes
+        return (head_load + routes[other_route].load - other_head_load <= self.capacity and
+                other_head_load + routes[route_index].load - head_load <= self.capacity)
+
+    def moves(self, node):
+        """ Return (delta, move type, move arguments) of all the moves of node that fit in the trucks """
+        solution = self.solution
+        route_index, position = solution.route_of.item(node), solution.position_of.item(node)
+        route_length = len(solution.routes[route_index])
+        candidates = []
+        for neighbor in self.neighbor_lists[self.neighbor_row[node]].tolist():
+            other_route = solution.route_of.item(neighbor)
+            if other_route == route_index or other_route == NOT_ASSIGNED:
+                continue
+            other_position = solution.position_of.item(neighbor)
+            other_length = len(solution.routes[other_route])
+
+            if solution.routes[other_route].load + self.demand.item(node) <= self.capacity:
+                for to_position in (other_position, other_position + 1):
+                    candidates.append((self.relocate_delta(node, route_index, position, other_route, to_position),
+                                       RELOCATE, (node, other_route, to_position)))
+
+            # swap is the exchange of the two single node segments, cross-exchange puts v after u
+            exchanges = [(position, 1, other_position, 1)]
+            exchanges += [(position + 1, length, other_position, other_segment_length)
+                          for length in range(1, min(CROSS_SEGMENT, route_length - position - 1) + 1)
+                          for other_segment_length in range(1, min(CROSS_SEGMENT, other_length - other_position) + 1)]
+            for start, length, other_start, other_segment_length in exchanges:
+                if self.exchange_fits(route_index, start, length, other_route, other_start, other_segment_length):
+                    arguments = (route_index, start, length, other_route, other_start, other_segment_length)
+                    candidates.append((self.exchange_delta(*arguments), EXCHANGE, arguments))
+
+            # u followed by v and v followed by u
+            for split, other_split in ((position + 1, other_position), (position, other_position + 1)):
+                if self.two_opt_star_fits(route_index, split, other_route, other_split):
+                    arguments = (route_index, split, other_route, other_split)
+                    candidates.append((self.two_opt_star_delta(*arguments), TWO_OPT_STAR, arguments))
+        return candidates
+
+    def best_move(self, node):
+        """ Return (delta, move type, move arguments) of the best improving move of node, or None """
+        best = None
+        for candidate in self.moves(node):
+            if candidate[0] < -EPSILON and (best is None or candidate[0] < best[0]):
+                best = candidate
+        return best
+
+    def moved_nodes(self, move_type, arguments):
+        """ Return (node, from route, to route) of the customers that the move puts in another route. For 2-opt*
+        only the first customer of each tail is returned.
+        """
+        solution = self.solution
+        if move_type == RELOCATE:
+            node, other_route, _ = arguments
+            return [(node, solution.route_of.item(node), other_route)]
+        if move_type == EXCHANGE:
+            route_index, start, length, other_route, other_start, other_length = arguments
+            return ([(self.node_at(route_index, position), route_index, other_route)
+                     for position in range(start, start + length)] +
+                    [(self.node_at(other_route, position), other_route, route_index)
+                     for position in range(other_start, other_start + other_length)])
+        route_index, split, other_route, other_split = arguments
+        moved = []
+        if split < len(solution.routes[route_index]):
+            moved.append((self.node_at(route_index, split), route_index, other_route))
+        if other_split < len(solution.routes[other_route]):
+            moved.append((self.node_at(other_route, other_split), other_route, route_index))
+        return moved
+
+    def changed_nodes(self, move_type, arguments):
+        """ Customers next to the edges that the move removes """
+        if move_type == RELOCATE:
+            node, other_route, to_position = arguments
+            route_index, position = self.solution.route_of.item(node), self.solution.position_of.item(node)
+            nodes = [self.node_at(route_index, position - 1), node, self.node_at(route_index, position + 1),
+                     self.node_at(other_route, to_position - 1), self.node_at(other_route, to_position)]
+        elif move_type == EXCHANGE:
+            route_index, start, length, other_route, other_start, other_length = arguments
+            nodes = [self.node_at(route_index, start - 1), self.node_at(route_index, start),
+                     self.node_at(route_index, start + length - 1), self.node_at(route_index, start + length),
+                     self.node_at(other_route, other_start - 1), self.node_at(other_route, other_start),
+                     self.node_at(other_route, other_start + other_length - 1),
+                     self.node_at(other_route, other_start + other_length)]
+        else:
+            route_index, split, other_route, other_split = arguments
+            nodes = [self.node_at(route_index, split - 1), self.node_at(route_index, split),
+                     self.node_at(other_route, other_split - 1), self.node_at(other_route, other_split)]
+        return [node for node in nodes if node != self.depot]
+
+    def apply(self, move_type, arguments):
+        """ Apply the move and return the indexes of the changed routes """
+        solution = self.solution
+        if move_type == RELOCATE:
+            node, other_route, to_position = arguments
+            route_index, _ = solution.remove(node)
+            solution.insert(other_route, to_position, node)
+            return route_index, other_route
+
+        if move_type == EXCHANGE:
+            route_index, start, length, other_route, other_start, other_length = arguments
+            sequence = solution.routes[route_index].sequence()
+            other_sequence = solution.routes[other_route].sequence()
+            new_sequence = np.concatenate((sequence[:start], other_sequence[other_start:other_start + other_length],
+                                           sequence[start + length:]))
+            new_other_sequence = np.concatenate((other_sequence[:other_start], sequence[start:start + length],
+                                                 other_sequence[other_start + other_length:]))
+        else:
+            route_index, split, other_route, other_split = arguments
+            sequence = solution.routes[route_index].sequence()
+            other_sequence = solution.routes[other_route].sequence()
+            new_sequence = np.concatenate((sequence[:split], other_sequence[other_split:]))
+            new_other_sequence = np.concatenate((other_sequence[:other_split], sequence[split:]))
+        solution.set_sequence(route_index, new_sequence)
+        solution.set_sequence(other_route, new_other_sequence)
+        return route_index, other_route
+
+    def improve(self, deadline=None):
+        """ Apply the best move of each customer until no customer has an improving move or the deadline passes.
+        Return the moves applied
+        """
+        look = np.zeros(len(self.solution.route_of), dtype=bool)
+        look[self.customers] = True
+        queue = deque(self.customers.tolist())
+        moves = 0
+        while queue and not deadline_passed(deadline):
+            node = queue.popleft()
+            look[node] = False
+            move = self.best_move(node)
+            if move is None:
+                continue
+            _, move_type, arguments = move
+            changed_nodes = self.changed_nodes(move_type, arguments)
+            for route_index in self.apply(move_type, arguments):
+                self.prefix_loads.pop(route_index, None)
+            moves += 1
+            for changed_node in changed_nodes:
+                if not look[changed_node]:
+                    look[changed_node] = True
+                    queue.append(changed_node)
+        return moves
+
+
+def improve_solution(solution, neighbors=INTER_ROUTE_NEIGHBORS, deadline=None):
+    """ Apply inter route moves until a local optimum or the deadline, drop the routes that were emptied and return
+    the moves
+    """
+    moves = InterRouteSearch(solution, neighbors).improve(deadline)
+    solution.drop_empty_routes()
+    return moves
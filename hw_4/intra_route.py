@@ -0,0 +1,177 @@
+"""
+    Local search inside a route with 2-opt and Or-opt moves. Distances are symmetric, so a move changes only the
+    few edges at its ends and its cost is calculated in O(1) from the distance matrix:
+    2-opt  - reverse the nodes between two edges (a, b) and (c, e): d(a, c) + d(b, e) - d(a, b) - d(c, e)
+    Or-opt - move a segment of up to OR_OPT_SEGMENT nodes, maybe reversed, between two other nodes
+
+    The deltas of all 2-opt moves of a route are calculated at once from the (m, m) distances of the route nodes,
+    and the deltas of all insert positions of an Or-opt segment at once. With first improvement the first improving
+    move (in order of positions) is applied, with best improvement the best move. Moves are applied until no move
+    improves the route (local optimum).
+"""
+import numpy as np
+
+from search_controller import deadline_passed
+
+# longest segment that Or-opt moves
+OR_OPT_SEGMENT = 3
+# deltas above -EPSILON are not improvements, so float distances do not loop on rounding errors
+EPSILON = 1e-9
+
+
+def route_distances(distances, tour):
+    """ Return the (m, m) distances between the nodes of tour, as float """
+    return distances.values[tour[:, np.newaxis], tour[np.newaxis, :]].astype(np.float64)
+
+
+def select_move(deltas, first_improvement):
+    """ Return the position of the selected improving delta in the flat deltas array, or None """
+    if first_improvement:
+        improving = np.flatnonzero(deltas < -EPSILON)
+        return improving[0] if len(improving) else None
+    best = np.argmin(deltas)
+    return best if deltas[best] < -EPSILON else None
+
+
+def no_op_moves(length):
+    """ Return the mask of the 2-opt moves of a tour with length nodes that change nothing """
+    return np.tri(length - 1, k=1, dtype=bool)
+
+
+def two_opt_deltas(tour_distances, no_op=None):
+    """
+    :param tour_distances: numpy array (m, m), distances of a tour that starts and ends at the depot
+    :param no_op: numpy array, no_op_moves(m). It can be given when many tours of the same length are evaluated
+    :return: numpy array (m - 1, m - 1)
+
+    deltas[i, j] is the cost change of reversing tour[i + 1:j + 1]. Moves with j < i + 2 change nothing and get inf.
+    """
+    edges = np.diagonal(tour_distances, 1)
+    deltas = tour_distances[:-1, :-1] + tour_distances[1:, 1:]
+    deltas -= edges[:, np.newaxis]
+    deltas -= edges
+    deltas[no_op_moves(len(tour_distances)) if no_op is None else no_op] = np.inf
+    return deltas
+
+
+def two_opt_move(tour_distances, first_improvement=False, no_op=None):
+    """ Return (i, j, delta) of the selected improving 2-opt move, or None """
+    deltas = two_opt_deltas(tour_distances, no_op)
+    move = select_move(deltas.ravel(), first_improvement)
+    if move is None:
+        return None
+    i, j = divmod(int(move), deltas.shape[1])
+    return i, j, deltas[i, j].item()
+
+
+def or_opt_move(tour_distances, first_improvement=False):
+    """
+    :return: (start, end, position, reversed, delta) of the selected improving move or None
+
+    The segment tour[start:end + 1] is moved between tour[position] and tour[position + 1].
+    """
+    last = len(tour_distances) - 1
+    positions = np.arange(last)
+    edges = np.diagonal(tour_distances, 1)
+    best_move = None
+    for segment_length in range(1, OR_OPT_SEGMENT + 1):
+        for start in range(1, last - segment_length + 1):
+            end = start + segment_length - 1
+            removal_gain = (tour_distances[start - 1, start] + tour_distances[end, end + 1] -
+                            tour_distances[start - 1, end + 1])
+            forward = tour_distances[positions, start] + tour_distances[end, positions + 1] - edges
+            backward = tour_distances[positions, end] + tour_distances[start, positions + 1] - edges
+            deltas = np.minimum(forward, backward) - removal_gain
+            # positions next to or inside the segment put it back in its place
+            deltas[start - 1:end + 1] = np.inf
+            position = select_move(deltas, first_improvement)
+            if position is None or (best_move is not None and deltas[position] >= best_move[4]):
+                continue
+            best_move = (start, end, int(position), bool(backward[position] < forward[position]),
+                         deltas[position].item())
+            if first_improvement:
+                return best_move
+    return best_move
+
+
+def apply_two_opt(tour, i, j):
+    tour = tour.copy()
+    tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+    return tour
+
+
+def apply_or_opt(tour, start, end, position, reverse):
+    segment = tour[start:end + 1]
+    if reverse:
+        segment = segment[::-1]
+    rest = np.concatenate((tour[:start], tour[end + 1:]))
+    # position counts the nodes of the tour before the segment was removed
+    position = position if position < start else position - len(segment)
+    return np.concatenate((rest[:position + 1], segment, rest[position + 1:]))
+
+
+def improve_tour(distances, tour, first_improvement=False):
+    """
+    :param distances: distance_matrix.DistanceMatrix
+    :param tour: numpy array, route nodes with the depot at the start and the end
+    :param first_improvement: bool, apply the first improving move found instead of the best one
+    :return: tuple (improved tour, number of moves applied)
+
+    Apply 2-opt moves, and Or-opt moves when no 2-opt move improves the tour, until the tour is a local optimum.
+    The distances of the tour are taken from the matrix once and reordered with each move.
+    """
+    if len(tour) < 4:
+        return tour, 0
+    tour_distances = route_distances(distances, tour)
+    no_op = no_op_moves(len(tour))
+    moves = 0
+    while True:
+        move = two_opt_move(tour_distances, first_improvement, no_op)
+        if move is not None:
+            order = apply_two_opt(np.arange(len(tour)), *move[:2])
+        else:
+            move = or_opt_move(tour_distances, first_improvement)
+            if move is None:
+                break
+            order = apply_or_opt(np.arange(len(tour)), *move[:4])
+        tour = tour[order]
+        tour_distances = tour_distances[order][:, order]
+        moves += 1
+    return tour, moves
+
+
+def take_cached_route(solution, route_index, path, cached):
+    """ Give the route with this path the cached (improved path, cost). Return 1 if the route changed, else 0 """
+    tour, cost = cached
+    if len(tour) == len(path) and (tour == path).all():
+        return 0
+    solution.set_sequence(route_index, tour[1:-1], cost)
+    return 1
+
+
+def improve_route(solution, route_index, first_improvement=False, route_cache=None):
+    """ Bring a route of the solution to a local optimum and return the number of moves applied.
+    A route found in route_cache (improved_route_cache.ImprovedRouteCache) takes the cached result without a search.
+    """
+    path = solution.path(route_index)
+    cached = route_cache.get(path, first_improvement) if route_cache is not None else None
+    if cached is not None:
+        return take_cached_route(solution, route_index, path, cached)
+    tour, moves = improve_tour(solution.distances, path, first_improvement)
+    if moves:
+        solution.set_sequence(route_index, tour[1:-1])
+    if route_cache is not None:
+        route_cache.put(path, first_improvement, tour, solution.routes[route_index].cost)
+    return moves
+
+
+def improve_routes(solution, first_improvement=False, route_cache=None, deadline=None):
+    """ Bring every route of the solution to a local optimum, until the deadline passes. Return the number of moves
+    applied
+    """
+    moves = 0
+    for route_index in range(len(solution.routes)):
+        if deadline_passed(deadline):
+            break
+        moves += improve_route(solution, route_index, first_improvement, route_cache)
+    return moves
@@ -0,0 +1,251 @@
+"""
+    Large neighborhood search (ruin and recreate). Each iteration removes some customers from a copy of the current
+    solution and inserts them back, and the new solution replaces the current one if it is at most
+    RECORD_DEVIATION worse than the best solution found (record to record travel).
+
+    Removal (ruin):
+    random - random customers
+    radial - a random customer and its nearest customers
+    string - strings of consecutive customers from the routes of a random customer and its nearest customers
+    route  - all customers of a random route, used only while the solution has more routes than trucks
+    Insertion (recreate):
+    greedy - insert the customer with the cheapest insertion first
+    regret - insert first the customer that loses the most if it is not put in its best route (regret-2)
+
+    The insertion cost of every removed customer in every position of every route is calculated with one numpy
+    operation over the edges of all routes, d(a, u) + d(u, b) - d(a, b), and reduced to the best position of each
+    route. After each insertion only the column of the changed route is calculated again. An empty route is kept
+    available while the routes are fewer than the trucks of the instance; over that a new route is opened only for a
+    customer that fits in no route, and candidates with more routes than the trucks (or than the current solution,
+    if it already has more) are rejected.
+
+    In order to run: python large_neighborhood_search.py <file_name> [<time_budget_secs>]
+"""
+import sys
+
+import numpy as np
+
+import construction_heuristic as con_heu
+import intra_route
+import solution_verifier
+from search_controller import SearchController, EPSILON
+from solution import NOT_ASSIGNED
+
+MIN_REMOVED = 5
+MAX_REMOVED = 60
+# at most this share of the customers is removed in an iteration
+REMOVED_SHARE = 0.15
+MAX_STRING = 10
+RECORD_DEVIATION = 0.01
+TIME_BUDGET = 60
+
+RANDOM_REMOVAL = 'random'
+RADIAL_REMOVAL = 'radial'
+STRING_REMOVAL = 'string'
+ROUTE_REMOVAL = 'route'
+GREEDY_INSERTION = 'greedy'
+REGRET_INSERTION = 'regret'
+
+
+class LargeNeighborhoodSearch:
+    def __init__(self, solution, min_removed=MIN_REMOVED, max_removed=MAX_REMOVED, deviation=RECORD_DEVIATION,
+                 removals=(RANDOM_REMOVAL, RADIAL_REMOVAL, STRING_REMOVAL),
+                 insertions=(GREEDY_INSERTION, REGRET_INSERTION), seed=None):
+        """
+        :param solution: solution.Solution, the current solution. It is changed in place
+        :param min_removed: int
+        :param max_removed: int, also limited by REMOVED_SHARE of the customers
+        :param deviation: float, new solutions up to this ratio worse than the best one are accepted
+        :param removals: removal methods to choose from
+        :param insertions: insertion methods to choose from
+        :param seed: int or None
+        """
+        self.solution = solution
+        self.distances = solution.distances
+        self.depot = solution.depot
+        self.demand = solution.instance.demand
+        self.capacity = solution.instance.truck_capacity
+        self.customers = np.flatnonzero(solution.route_of != NOT_ASSIGNED)
+        # None when the instance does not give the number of trucks
+        self.max_routes = solution.instance.num_of_trucks
+        self.max_removed = max(min(max_removed, int(REMOVED_SHARE * len(self.customers))), 1)
+        self.min_removed = min(min_removed, self.max_removed)
+        self.deviation = deviation
+        self.removals = removals
+        self.insertions = insertions
+        self.random = np.random.default_rng(seed)
+        self.best_cost = solution.total_cost()
+        self.controller = None
+        self.statistics = {'accepted': 0, 'rejected': 0}
+
+    def nearest_customers(self, node, count):
+        """ Return the count customers nearest to node (node included), nearest first """
+        node_distances = self.distances.values[node, self.customers]
+        count = min(count, len(self.customers))
+        nearest = np.argpartition(node_distances, count - 1)[:count]
+        return self.customers[nearest[np.argsort(node_distances[nearest], kind='stable')]]
+
+    def ruin(self, solution, removal, count):
+        """ Remove count customers from solution and return them """
+        if removal == RANDOM_REMOVAL:
+            removed = self.random.choice(self.customers, count, replace=False)
+        elif removal == RADIAL_REMOVAL:
+            removed = self.nearest_customers(self.random.choice(self.customers), count)
+        elif removal == ROUTE_REMOVAL:
+            removed = solution.routes[self.random.integers(len(solution.routes))].sequence().copy()
+        else:
+            removed = []
+            used_routes = set()
+            for node in self.nearest_customers(self.random.choice(self.customers), 4 * count).tolist():
+                route_index = solution.route_of.item(node)
+                if len(removed) >= count or route_index in used_routes:
+                    continue
+                used_routes.add(route_index)
+                route = solution.routes[route_index]
+                length = self.random.integers(1, min(len(route), MAX_STRING, count - len(removed)) + 1)
+                position = solution.position_of.item(node)
+                start = self.random.integers(max(position - length + 1, 0), min(position, len(route) - length) + 1)
+                removed.extend(route.sequence()[start:start + length].tolist())
+            removed = np.array(removed, dtype=np.intp)
+        for node in removed.tolist():
+            solution.remove(node)
+        if removal == ROUTE_REMOVAL:
+            solution.drop_empty_routes()
+        return removed
+
+    def insertion_costs(self, solution, nodes, route_indexes):
+        """
+        :return: tuple (costs, positions), arrays (len(nodes), len(route_indexes)) with the cost of the best
+        insertion of each node in each route and its position. Routes without capacity for a node get inf.
+        """
+        paths = [solution.path(route_index) for route_index in route_indexes]
+        edge_counts = np.array([len(path) - 1 for path in paths])
+        route_starts = np.zeros(len(paths), dtype=np.intp)
+        np.cumsum(edge_counts[:-1], out=route_starts[1:])
+        edges_from = np.concatenate([path[:-1] for path in paths])
+        edges_to = np.concatenate([path[1:] for path in paths])
+
+        values = self.distances.values
+        costs = (values[nodes[:, np.newaxis], edges_from].astype(np.float64) + values[nodes[:, np.newaxis], edges_to] -
+                 values[edges_from, edges_to])
+        route_costs = np.minimum.reduceat(costs, route_starts, axis=1)
+        # first edge of each route with the min cost, its position in the route is the insert position
+        edge_indexes = np.where(costs == np.repeat(route_costs, edge_counts, axis=1), np.arange(len(edges_from)),
+                                len(edges_from))
+        positions = np.minimum.reduceat(edge_indexes, route_starts, axis=1) - route_starts
+
+        loads = np.array([solution.routes[route_index].load for route_index in route_indexes])
+        route_costs[loads + self.demand[nodes][:, np.newaxis] > self.capacity] = np.inf
+        return route_costs, positions
+
+    def can_open_route(self, solution):
+        return self.max_routes is None or len(solution.routes) < self.max_routes
+
+    def open_route(self, solution, nodes, costs, positions):
+        """ Add an empty route and its column of insertion costs """
+        route_index = solution.add_route()
+        route_costs, route_positions = self.insertion_costs(solution, nodes, [route_index])
+        return np.hstack((costs, route_costs)), np.hstack((positions, route_positions))
+
+    def recreate(self, solution, nodes, insertion):
+        """ Insert nodes in solution with greedy or regret insertion """
+        if not any(len(route) == 0 for route in solution.routes) and self.can_open_route(solution):
+            solution.add_route()
+        costs, positions = self.insertion_costs(solution, nodes, range(len(solution.routes)))
+        remaining = np.ones(len(nodes), dtype=bool)
+        while remaining.any():
+            rows = np.flatnonzero(remaining)
+            if insertion == REGRET_INSERTION and costs.shape[1] > 1:
+                two_best = np.partition(costs[rows], 1, axis=1)[:, :2]
+                # customers that fit in one route or in none have infinite regret, the cheapest of them goes first
+                with np.errstate(invalid='ignore'):
+                    regrets = two_best[:, 1] - two_best[:, 0]
+                regrets[np.isinf(two_best[:, 0])] = np.inf
+                best_rows = np.flatnonzero(regrets == regrets.max())
+                row = rows[best_rows[np.argmin(two_best[best_rows, 0])]]
+            else:
+                row = rows[np.argmin(costs[rows].min(axis=1))]
+            if np.isinf(costs[row]).all():
+                # the customer fits in no route, a route over the trucks is the last resort
+                costs, positions = self.open_route(solution, nodes, costs, positions)
+            route_index = int(np.argmin(costs[row]))
+            solution.insert(route_index, int(positions[row, route_index]), nodes.item(row))
+            remaining[row] = False
+
+            costs[:, route_index], positions[:, route_index] = (
+                column[:, 0] for column in self.insertion_costs(solution, nodes, [route_index]))
+            if not any(len(route) == 0 for route in solution.routes) and self.can_open_route(solution):
+                costs, positions = self.open_route(solution, nodes, costs, positions)
+        solution.drop_empty_routes()
+
+    def step(self, solution):
+        """ One ruin and recreate iteration. LNS can always leave its current solution, so it returns True """
+        if self.controller is not None:
+            self.best_cost = min(self.best_cost, self.controller.best_cost)
+        candidate = solution.copy()
+        count = int(self.random.integers(self.min_removed, self.max_removed + 1))
+        removal = self.random.choice(self.removals)
+        if self.max_routes is not None and len(solution.routes) > self.max_routes and self.random.random() < 0.5:
+            removal = ROUTE_REMOVAL
+        removed = self.ruin(candidate, removal, count)
+        self.recreate(candidate, removed, self.random.choice(self.insertions))
+
+        candidate_cost = candidate.total_cost()
+        if self.max_routes is not None and len(candidate.routes) > max(self.max_routes, len(solution.routes)):
+            self.statistics['rejected'] += 1
+        elif self.max_routes is not None and len(solution.routes) > max(self.max_routes, len(candidate.routes)):
+            # a solution over the trucks takes any candidate with fewer routes, whatever its cost
+            solution.restore(candidate)
+            self.best_cost = candidate_cost
+            if self.controller is not None and len(candidate.routes) == self.max_routes:
+                self.controller.replace_best(candidate)
+            self.statistics['accepted'] += 1
+        elif candidate_cost < self.best_cost * (1 + self.deviation) - EPSILON or candidate_cost < solution.total_cost():
+            solution.restore(candidate)
+            self.best_cost = min(self.best_cost, candidate_cost)
+            self.statistics['accepted'] += 1
+        else:
+            self.statistics['rejected'] += 1
+        return True
+
+
+def large_neighborhood_search(solution, time_budget=TIME_BUDGET, max_iterations=None, max_no_improvement=None,
+                              **lns_options):
+    """
+    :param solution: solution.Solution, the start solution. It is changed in place
+    :param time_budget: secs or None
+    :param max_iterations: int or None, ruin and recreate iterations
+    :param max_no_improvement: int or None, iterations without a new best solution
+    :param lns_options: the options of LargeNeighborhoodSearch
+    :return: tuple (SearchController, LargeNeighborhoodSearch). The best solution is the best attribute of the
+    controller
+    """
+    lns = LargeNeighborhoodSearch(solution, **lns_options)
+    controller = SearchController(solution, time_budget, max_iterations, max_no_improvement)
+    lns.controller = controller
+    controller.run(lns.step)
+    return controller, lns
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("In order to run: python large_neighborhood_search.py <file_name> [<time_budget_secs>]")
+        return
+    file_name = sys.argv[1]
+    time_budget = float(sys.argv[2]) if len(sys.argv) > 2 else TIME_BUDGET
+
+    instance, distances, solution, value_to_improve = con_heu.main(file_name)
+    if instance and distances and solution and value_to_improve:
+        controller, lns = large_neighborhood_search(solution, time_budget)
+        controller.print_summary()
+        print('Iterations accepted: {accepted}, rejected: {rejected}'.format(**lns.statistics))
+        # insertion does not reorder routes, the order of each route is improved at the end
+        intra_route.improve_routes(controller.best)
+        print('----LARGE NEIGHBORHOOD SEARCH SOLUTION----')
+        con_heu.print_results(instance, controller.best)
+        report = solution_verifier.verify(controller.best, solution_verifier.best_known_cost_of(file_name))
+        solution_verifier.print_report(instance, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+    Parallel intra route improvement. 2-opt/Or-opt search of a route (intra_route.py) does not depend on the other
+    routes, so routes are improved in a process pool and the improved sequences are written back to the solution.
+
+    The distance matrix is put once in shared memory and every worker maps it, so a task sends only the nodes of
+    its route. For instances without a dense matrix the coords are shared and distances are calculated from them.
+    The pool is kept open between calls, so an improvement loop pays the start up cost once.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import intra_route
+from distance_matrix import DistanceMatrix, CoordinateDistances
+from search_controller import deadline_passed
+
+# routes shorter than this are improved in the main process, sending them costs more than improving them
+PARALLEL_ROUTE_LENGTH = 8
+
+# set in every worker by attach_distances
+worker_data = {}
+
+
+def share_array(array, shared_blocks):
+    """ Copy array to a new shared memory block and return what a worker needs to map it """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared_blocks.append(block)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block.name, array.shape, array.dtype.str
+
+
+def map_array(block_name, shape, dtype, blocks):
+    block = shared_memory.SharedMemory(name=block_name)
+    blocks.append(block)  # the block must stay open while the array is used
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def attach_distances(shared_values, shared_coords, edge_weight_type):
+    blocks = []
+    if shared_values is None:
+        x, y = (map_array(*shared_array, blocks) for shared_array in shared_coords)
+        distances = DistanceMatrix(CoordinateDistances(x, y, edge_weight_type), edge_weight_type)
+    else:
+        distances = DistanceMatrix(map_array(*shared_values, blocks), edge_weight_type)
+    worker_data.update(distances=distances, blocks=blocks)
+
+
+def improve_tour(tour, first_improvement):
+    return intra_route.improve_tour(worker_data['distances'], tour, first_improvement)
+
+
+class ParallelRouteOptimizer:
+    def __init__(self, distances, processes=None):
+        """
+        :param distances: distance_matrix.DistanceMatrix
+        :param processes: int, defaults to the number of cpus
+        """
+        self.distances = distances
+        self.processes = processes or os.cpu_count()
+        self.shared_blocks = []
+        try:
+            shared_values, shared_coords = None, None
+            if isinstance(distances.values, np.ndarray):
+                shared_values = share_array(np.asarray(distances.values), self.shared_blocks)
+            else:
+                shared_coords = [share_array(distances.values.x, self.shared_blocks),
+                                 share_array(distances.values.y, self.shared_blocks)]
+            self.executor = ProcessPoolExecutor(self.processes, initializer=attach_distances,
+                                                initargs=(shared_values, shared_coords, distances.edge_weight_type))
+        except Exception:
+            self.release_blocks()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def release_blocks(self):
+        for block in self.shared_blocks:
+            block.close()
+            block.unlink()
+        self.shared_blocks = []
+
+    def close(self):
+        self.executor.shutdown()
+        self.release_blocks()
+
+    def improve_routes(self, solution, first_improvement=False, route_cache=None, deadline=None):
+        """ Bring every route of the solution to a local optimum and return the number of moves applied.
+        Routes found in route_cache (improved_route_cache.ImprovedRouteCache) take the cached result and are not sent.
+        Routes whose result is not ready at the deadline are left as they are.
+        """
+        route_indexes = []
+        cached_routes = {}
+        for route_index, route in enumerate(solution.routes):
+            if len(route) < PARALLEL_ROUTE_LENGTH:
+                continue
+            path = solution.path(route_index)
+            cached = route_cache.get(path, first_improvement) if route_cache is not None else None
+            if cached is None:
+                route_indexes.append(route_index)
+            else:
+                cached_routes[route_index] = (path, cached)
+        # longest routes first, so no worker is left with a long route at the end
+        route_indexes.sort(key=lambda route_index: len(solution.routes[route_index]), reverse=True)
+        futures = [self.executor.submit(improve_tour, solution.path(route_index), first_improvement)
+                   for route_index in route_indexes]
+
+        moves = 0
+        for route_index, route in enumerate(solution.routes):
+            if 1 < len(route) < PARALLEL_ROUTE_LENGTH and not deadline_passed(deadline):
+                moves += intra_route.improve_route(solution, route_index, first_improvement, route_cache)
+        for route_index, (path, cached) in cached_routes.items():
+            moves += intra_route.take_cached_route(solution, route_index, path, cached)
+        if deadline is not None:
+            wait(futures, timeout=max(deadline - time.time(), 0))
+        for route_index, future in zip(route_indexes, futures):
+            if deadline is not None and not future.done():
+                # a running route finishes in the background, its result is not used
+                future.cancel()
+                continue
+            path = solution.path(route_index)
+            tour, route_moves = future.result()
+            if route_moves:
+                solution.set_sequence(route_index, tour[1:-1])
+                moves += route_moves
+            if route_cache is not None:
+                route_cache.put(path, first_improvement, tour, solution.routes[route_index].cost)
+        return moves
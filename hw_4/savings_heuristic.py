@@ -0,0 +1,146 @@
+"""
+    Clarke-Wright savings construction heuristic (parallel version).
+    Every customer starts in its own route depot-i-depot. Joining the routes of i and j with the edge i-j saves
+    s(i, j) = d(depot, i) + d(depot, j) - d(i, j), so edges are processed from the biggest saving and two routes
+    are merged when i and j are route ends of different routes and the merged load fits in a truck.
+
+    Only the pairs of each customer with its SAVINGS_NEIGHBORS nearest customers are considered, so there are
+    O(n * k) savings instead of O(n^2). They are calculated at once and sorted with one argsort. Each node keeps
+    its two route neighbors (-1 is the depot) and routes are tracked with union-find, so a merge is O(1) and the
+    routes are walked only once at the end.
+
+    In order to run: python savings_heuristic.py <file_name>
+"""
+import sys
+
+import numpy as np
+
+import construction_heuristic as con_heu
+import solution_verifier
+import vrp_parser
+from distance_matrix import DistanceMatrix
+from solution import Solution
+from spatial_index import GridIndex
+
+SAVINGS_NEIGHBORS = 16
+DEPOT_LINK = -1
+
+
+def calculate_savings(instance, distances, customers, neighbors=SAVINGS_NEIGHBORS):
+    """
+    :param instance: vrp_parser.CVRPInstance
+    :param distances: distance_matrix.DistanceMatrix
+    :param customers: numpy array with the customers to route
+    :param neighbors: int, pairs of each customer with its nearest customers are considered
+    :return: tuple (first_nodes, second_nodes, savings) with positive savings, biggest first
+    """
+    depot = instance.depot
+    spatial_index = GridIndex(instance.x, instance.y, np.isin(np.arange(len(instance)), customers),
+                              instance.edge_weight_type)
+    neighbor_lists = spatial_index.neighbor_lists(customers, neighbors)
+    first_nodes = np.repeat(customers, neighbor_lists.shape[1])
+    second_nodes = neighbor_lists.ravel()
+
+    # keep each pair once, as (smaller node, bigger node)
+    pairs = np.unique(np.minimum(first_nodes, second_nodes) * len(instance) + np.maximum(first_nodes, second_nodes))
+    first_nodes, second_nodes = pairs // len(instance), pairs % len(instance)
+
+    values = distances.values
+    depot_distances = values[depot, first_nodes].astype(np.result_type(values.dtype, np.int64))
+    savings = depot_distances + values[depot, second_nodes] - values[first_nodes, second_nodes]
+    keep = savings > 0
+    first_nodes, second_nodes, savings = first_nodes[keep], second_nodes[keep], savings[keep]
+    order = np.argsort(-savings, kind='stable')
+    return first_nodes[order], second_nodes[order], savings[order]
+
+
+def find_route(parent, node):
+    root = node
+    while parent[root] != root:
+        root = parent[root]
+    # path compression
+    while parent[node] != root:
+        parent[node], node = root, parent[node]
+    return root
+
+
+def merge_routes(instance, first_nodes, second_nodes):
+    """
+    :return: list with two route neighbors of every node, DEPOT_LINK where the node is next to the depot
+    """
+    capacity = instance.truck_capacity
+    links = [[DEPOT_LINK, DEPOT_LINK] for _ in range(len(instance))]
+    parent = list(range(len(instance)))
+    route_size = [1] * len(instance)
+    route_load = instance.demand.tolist()
+
+    for first_node, second_node in zip(first_nodes.tolist(), second_nodes.tolist()):
+        first_links, second_links = links[first_node], links[second_node]
+        # both nodes must be route ends, next to the depot
+        if DEPOT_LINK not in first_links or DEPOT_LINK not in second_links:
+            continue
+        first_route, second_route = find_route(parent, first_node), find_route(parent, second_node)
+        if first_route == second_route or route_load[first_route] + route_load[second_route] > capacity:
+            continue
+
+        first_links[first_links.index(DEPOT_LINK)] = second_node
+        second_links[second_links.index(DEPOT_LINK)] = first_node
+        # union by size
+        if route_size[first_route] < route_size[second_route]:
+            first_route, second_route = second_route, first_route
+        parent[second_route] = first_route
+        route_size[first_route] += route_size[second_route]
+        route_load[first_route] += route_load[second_route]
+    return links
+
+
+def routes_of_links(customers, links):
+    """ Walk every route from one of its ends and return the routes as lists of nodes """
+    visited = set()
+    routes = []
+    for node in customers.tolist():
+        if node in visited or DEPOT_LINK not in links[node]:
+            continue
+        route = []
+        previous_node = DEPOT_LINK
+        while node != DEPOT_LINK:
+            route.append(node)
+            visited.add(node)
+            first_link, second_link = links[node]
+            previous_node, node = node, second_link if first_link == previous_node else first_link
+        routes.append(route)
+    return routes
+
+
+def generate_savings_heuristic(instance, distances, neighbors=SAVINGS_NEIGHBORS):
+    customers = np.flatnonzero(instance.demand > 0)
+    customers = customers[customers != instance.depot]
+    first_nodes, second_nodes, _ = calculate_savings(instance, distances, customers, neighbors)
+    links = merge_routes(instance, first_nodes, second_nodes)
+
+    solution = Solution(instance, distances)
+    routes = routes_of_links(customers, links)
+    solution.set_sequences([solution.add_route() for _ in routes], routes)
+    return solution
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("In order to run: python savings_heuristic.py <file_name>")
+        return
+    file_name = sys.argv[1]
+    instance = vrp_parser.main(file_name)
+    if not con_heu.check_file(instance):
+        print("File {} had problem so I skipped it".format(file_name))
+        return
+    distances = DistanceMatrix.from_instance(instance)
+    solution = generate_savings_heuristic(instance, distances)
+
+    print('----SAVINGS HEURISTIC SOLUTION----')
+    con_heu.print_results(instance, solution)
+    report = solution_verifier.verify(solution, solution_verifier.best_known_cost_of(file_name))
+    solution_verifier.print_report(instance, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+    Anytime controller for the improvement heuristics. It runs iterations of a search step on a solution until one
+    of the budgets ends (wall clock secs, iterations, iterations without improvement) or the step reports that it
+    did not change the solution, i.e. the solution is a local optimum.
+
+    The best solution found (incumbent) is kept as a copy and every improvement is recorded as (secs, cost), so the
+    best solution and the trajectory can be read at any time, also while the search is running.
+
+    Budgets are checked between steps, and the time budget also as a deadline that steps pass to their inner loops,
+    so one long step does not overrun it.
+"""
+import time
+
+TIME_BUDGET = 'time budget'
+ITERATION_BUDGET = 'iteration budget'
+NO_IMPROVEMENT_BUDGET = 'no improvement budget'
+LOCAL_OPTIMUM = 'local optimum'
+# costs must drop more than EPSILON to count as improvement
+EPSILON = 1e-9
+
+
+def deadline_passed(deadline):
+    """ deadline is a time.time() value or None for no deadline """
+    return deadline is not None and time.time() >= deadline
+
+
+class SearchController:
+    def __init__(self, solution, time_budget=None, max_iterations=None, max_no_improvement=None):
+        """
+        :param solution: solution.Solution, the search changes it in place
+        :param time_budget: secs or None
+        :param max_iterations: int or None
+        :param max_no_improvement: int or None, iterations in a row without a new best solution
+        """
+        self.solution = solution
+        self.time_budget = time_budget
+        self.max_iterations = max_iterations
+        self.max_no_improvement = max_no_improvement
+        self.start_time = time.time()
+        self.deadline = None if time_budget is None else self.start_time + time_budget
+        self.iterations = 0
+        self.no_improvement = 0
+        self.stop_reason = None
+        self.best = solution.copy()
+        self.best_cost = solution.total_cost()
+        self.recorded_cost = self.best_cost
+        self.history = [(0.0, self.best_cost)]
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def budget_ended(self):
+        """ Return the budget that ended, or None """
+        if self.time_budget is not None and self.elapsed() >= self.time_budget:
+            return TIME_BUDGET
+        if self.max_iterations is not None and self.iterations >= self.max_iterations:
+            return ITERATION_BUDGET
+        if self.max_no_improvement is not None and self.no_improvement >= self.max_no_improvement:
+            return NO_IMPROVEMENT_BUDGET
+        return None
+
+    def offer(self, solution):
+        """ Keep a copy of solution if it is the new best. A step can call it when it is about to leave a solution
+        that may be the best one. Return True if it was kept.
+        """
+        cost = solution.total_cost()
+        if cost < self.best_cost - EPSILON:
+            self.best = solution.copy()
+            self.best_cost = cost
+            self.history.append((self.elapsed(), cost))
+            return True
+        return False
+
+    def replace_best(self, solution):
+        """ Keep a copy of solution as the best one even if it costs more, for a step that finds the first solution
+        meeting a constraint the best one breaks (e.g. the number of trucks)
+        """
+        self.best = solution.copy()
+        self.best_cost = solution.total_cost()
+        self.recorded_cost = self.best_cost
+        self.history.append((self.elapsed(), self.best_cost))
+
+    def record(self, solution=None):
+        """ Count an iteration and keep solution (the searched solution by default) if it is the new best """
+        self.iterations += 1
+        self.offer(self.solution if solution is None else solution)
+        improved = self.best_cost < self.recorded_cost - EPSILON
+        self.no_improvement = 0 if improved else self.no_improvement + 1
+        self.recorded_cost = self.best_cost
+        return improved
+
+    def run(self, step):
+        """
+        :param step: function that takes the solution, changes it and returns False when it changed nothing. It can
+        read the deadline attribute to stop early
+        :return: solution.Solution, the best solution found
+        """
+        while True:
+            self.stop_reason = self.budget_ended()
+            if self.stop_reason is not None:
+                break
+            changed = step(self.solution)
+            self.record()
+            if not changed:
+                # a step cut by the deadline may change nothing without being at a local optimum
+                self.stop_reason = TIME_BUDGET if deadline_passed(self.deadline) else LOCAL_OPTIMUM
+                break
+        return self.best
+
+    def print_summary(self):
+        print('Stopped by {} after {} iterations and {:.3f} secs'.format(self.stop_reason, self.iterations,
+                                                                         self.elapsed()))
+        print('Best cost per time: ', ' '.join('{:.3f}s:{}'.format(secs, cost) for secs, cost in self.history))
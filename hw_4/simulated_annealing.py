@@ -0,0 +1,212 @@
+"""
+    Simulated annealing over relocate, swap, 2-opt* (between routes) and 2-opt (inside a route) moves.
+    Each iteration samples a customer u and one of its nearest customers v and a move that makes them neighbors.
+    The delta of the move is calculated in O(1) from the distance matrix and its capacity check from the cached
+    route loads (inter_route.InterRouteSearch), and the move is only applied if it is accepted: always when it does
+    not make the solution worse, otherwise with probability exp(-delta / temperature).
+
+    Cooling schedules, called after every move evaluation with the current temperature:
+    geometric  - T * alpha
+    Lundy-Mees - T / (1 + beta * T)
+    Reheating (any schedule): after reheat_after evaluations without a new best solution the temperature is set back
+    to reheat_ratio * initial temperature.
+
+    It runs under search_controller.SearchController, one controller iteration is MOVES_PER_STEP evaluations.
+
+    In order to run: python simulated_annealing.py <file_name> [<time_budget_secs> <geometric|lundy_mees>]
+"""
+import math
+import random
+import sys
+
+import construction_heuristic as con_heu
+import solution_verifier
+from inter_route import InterRouteSearch, INTER_ROUTE_NEIGHBORS, RELOCATE, EXCHANGE, TWO_OPT_STAR, EPSILON
+from search_controller import SearchController
+
+MOVES_PER_STEP = 10000
+GEOMETRIC_ALPHA = 0.99999
+LUNDY_MEES_BETA = 1e-4
+# acceptance probability of an average worsening move at the initial temperature
+INITIAL_ACCEPTANCE = 0.5
+TIME_BUDGET = 60
+
+TWO_OPT = '2-opt'
+
+
+def geometric(alpha=GEOMETRIC_ALPHA):
+    return lambda temperature: temperature * alpha
+
+
+def lundy_mees(beta=LUNDY_MEES_BETA):
+    return lambda temperature: temperature / (1 + beta * temperature)
+
+
+SCHEDULES = {'geometric': geometric, 'lundy_mees': lundy_mees}
+
+
+class SimulatedAnnealing:
+    def __init__(self, solution, schedule=None, initial_temperature=None, reheat_after=None, reheat_ratio=0.5,
+                 neighbors=INTER_ROUTE_NEIGHBORS, seed=None):
+        """
+        :param solution: solution.Solution, it is changed in place
+        :param schedule: function temperature -> next temperature, geometric() by default
+        :param initial_temperature: number, calculated from sampled moves when None
+        :param reheat_after: int or None, evaluations without a new best solution before reheating
+        :param reheat_ratio: float, the temperature after reheating as a ratio of the initial temperature
+        :param neighbors: int, v is one of the neighbors nearest customers of u
+        :param seed: int or None
+        """
+        self.solution = solution
+        self.search = InterRouteSearch(solution, neighbors)
+        self.schedule = geometric() if schedule is None else schedule
+        self.reheat_after = reheat_after
+        self.reheat_ratio = reheat_ratio
+        self.random = random.Random(seed)
+        self.customers = self.search.customers.tolist()
+        self.current_cost = solution.total_cost()
+        self.evaluations = 0
+        self.accepted = 0
+        self.since_best = 0
+        self.controller = None
+        self.initial_temperature = (self.sample_initial_temperature() if initial_temperature is None
+                                    else initial_temperature)
+        self.temperature = self.initial_temperature
+
+    def sample_move(self):
+        """ Return (delta, move type, move arguments) of a random move, or None if it does not fit in the trucks """
+        solution, search = self.solution, self.search
+        node = self.random.choice(self.customers)
+        neighbor_list = search.neighbor_lists[search.neighbor_row[node]]
+        if not len(neighbor_list):
+            return None
+        neighbor = neighbor_list.item(self.random.randrange(len(neighbor_list)))
+        route_index, position = solution.route_of.item(node), solution.position_of.item(node)
+        other_route, other_position = solution.route_of.item(neighbor), solution.position_of.item(neighbor)
+
+        if route_index == other_route:
+            return self.two_opt(route_index, min(position, other_position), max(position, other_position))
+        move_type = self.random.randrange(4)
+        if move_type == 0:
+            if solution.routes[other_route].load + search.demand.item(node) > search.capacity:
+                return None
+            to_position = other_position + self.random.randrange(2)
+            return (search.relocate_delta(node, route_index, position, other_route, to_position), RELOCATE,
+                    (node, other_route, to_position))
+        if move_type == 1:
+            arguments = (route_index, position, 1, other_route, other_position, 1)
+            if not search.exchange_fits(*arguments):
+                return None
+            return search.exchange_delta(*arguments), EXCHANGE, arguments
+        # u followed by v or v followed by u
+        arguments = ((route_index, position + 1, other_route, other_position) if move_type == 2 else
+                     (route_index, position, other_route, other_position + 1))
+        if not search.two_opt_star_fits(*arguments):
+            return None
+        return search.two_opt_star_delta(*arguments), TWO_OPT_STAR, arguments
+
+    def two_opt(self, route_index, start, end):
+        """ Move that reverses the route between positions start + 1 and end, so the nodes at start and end become
+        neighbors. Return None if they already are.
+        """
+        if end - start < 2:
+            return None
+        distance = self.search.values.item
+        node_at = self.search.node_at
+        first, second = node_at(route_index, start), node_at(route_index, start + 1)
+        last, after = node_at(route_index, end), node_at(route_index, end + 1)
+        delta = distance(first, last) + distance(second, after) - distance(first, second) - distance(last, after)
+        return delta, TWO_OPT, (route_index, start, end)
+
+    def apply(self, move_type, arguments):
+        if move_type == TWO_OPT:
+            route_index, start, end = arguments
+            sequence = self.solution.routes[route_index].sequence().copy()
+            sequence[start + 1:end + 1] = sequence[start + 1:end + 1][::-1]
+            self.solution.set_sequence(route_index, sequence)
+            changed_routes = (route_index,)
+        else:
+            changed_routes = self.search.apply(move_type, arguments)
+        for route_index in changed_routes:
+            self.search.prefix_loads.pop(route_index, None)
+
+    def sample_initial_temperature(self, samples=1000):
+        """ Temperature that accepts the average sampled worsening move with probability INITIAL_ACCEPTANCE """
+        worsening = []
+        for _ in range(samples):
+            move = self.sample_move()
+            if move is not None and move[0] > EPSILON:
+                worsening.append(move[0])
+        if not worsening:
+            return 1.0
+        return -(sum(worsening) / len(worsening)) / math.log(INITIAL_ACCEPTANCE)
+
+    def step(self, solution, moves=MOVES_PER_STEP):
+        """ Evaluate moves random moves. Annealing never reaches a state it can not leave, so it returns True """
+        for _ in range(moves):
+            self.evaluations += 1
+            self.since_best += 1
+            self.temperature = self.schedule(self.temperature)
+            if self.reheat_after is not None and self.since_best >= self.reheat_after:
+                self.temperature = max(self.temperature, self.reheat_ratio * self.initial_temperature)
+                self.since_best = 0
+
+            move = self.sample_move()
+            if move is None:
+                continue
+            delta, move_type, arguments = move
+            if delta > EPSILON:
+                if self.temperature <= 0 or self.random.random() >= math.exp(-delta / self.temperature):
+                    continue
+                # the current solution may be the best one, keep it before leaving it
+                if self.controller is not None and self.current_cost < self.controller.best_cost - EPSILON:
+                    self.controller.offer(solution)
+            self.apply(move_type, arguments)
+            self.current_cost += delta
+            self.accepted += 1
+            if self.controller is not None and self.current_cost < self.controller.best_cost - EPSILON:
+                self.since_best = 0
+        self.current_cost = solution.total_cost()
+        return True
+
+
+def simulated_annealing(solution, time_budget=TIME_BUDGET, max_iterations=None, max_no_improvement=None,
+                        **annealing_options):
+    """
+    :param solution: solution.Solution, the start solution. It is changed in place
+    :param time_budget: secs or None
+    :param max_iterations: int or None, each iteration is MOVES_PER_STEP move evaluations
+    :param max_no_improvement: int or None, iterations without a new best solution
+    :param annealing_options: the options of SimulatedAnnealing
+    :return: tuple (SearchController, SimulatedAnnealing). The best solution is the best attribute of the controller
+    """
+    annealing = SimulatedAnnealing(solution, **annealing_options)
+    controller = SearchController(solution, time_budget, max_iterations, max_no_improvement)
+    annealing.controller = controller
+    controller.run(annealing.step)
+    controller.best.drop_empty_routes()
+    return controller, annealing
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("In order to run: python simulated_annealing.py <file_name> [<time_budget_secs> <geometric|lundy_mees>]")
+        return
+    file_name = sys.argv[1]
+    time_budget = float(sys.argv[2]) if len(sys.argv) > 2 else TIME_BUDGET
+    schedule = SCHEDULES[sys.argv[3]]() if len(sys.argv) > 3 else geometric()
+
+    instance, distances, solution, value_to_improve = con_heu.main(file_name)
+    if instance and distances and solution and value_to_improve:
+        controller, annealing = simulated_annealing(solution, time_budget, schedule=schedule)
+        print('----SIMULATED ANNEALING SOLUTION----')
+        con_heu.print_results(instance, controller.best)
+        controller.print_summary()
+        print('Moves evaluated: {}, accepted: {}, final temperature: {:.4f}'.format(
+            annealing.evaluations, annealing.accepted, annealing.temperature))
+        report = solution_verifier.verify(controller.best, solution_verifier.best_known_cost_of(file_name))
+        solution_verifier.print_report(instance, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+    Array backed CVRP solution, shared by the construction and the improvement heuristics.
+    Each route keeps its customers (depot not included) in an int array together with its load and cost. The
+    solution keeps the route and the position of every node and how many customers are still unserved, so every
+    change updates the state incrementally and nothing has to be rescanned.
+"""
+import numpy as np
+
+NOT_ASSIGNED = -1
+
+
+class Route:
+    __slots__ = ('nodes', 'length', 'load', 'cost')
+
+    def __init__(self, buffer_size=8):
+        self.nodes = np.empty(buffer_size, dtype=np.intp)
+        self.length = 0
+        self.load = 0
+        self.cost = 0
+
+    def __len__(self):
+        return self.length
+
+    def sequence(self):
+        """ Customers of the route in visiting order. It is a view, copy it before changing the route. """
+        return self.nodes[:self.length]
+
+    def reserve(self, length):
+        if length > len(self.nodes):
+            nodes = np.empty(max(length, 2 * len(self.nodes)), dtype=np.intp)
+            nodes[:self.length] = self.nodes[:self.length]
+            self.nodes = nodes
+
+    def copy(self):
+        route = Route(len(self.nodes))
+        route.nodes[:self.length] = self.nodes[:self.length]
+        route.length, route.load, route.cost = self.length, self.load, self.cost
+        return route
+
+
+class Solution:
+    __slots__ = ('instance', 'distances', 'depot', 'routes', 'route_of', 'position_of', 'unserved_count')
+
+    def __init__(self, instance, distances):
+        self.instance = instance
+        self.distances = distances
+        self.depot = instance.depot
+        self.routes = []
+        # route index and position in it of every node, NOT_ASSIGNED for unserved nodes and the depot
+        self.route_of = np.full(len(instance), NOT_ASSIGNED, dtype=np.intp)
+        self.position_of = np.full(len(instance), NOT_ASSIGNED, dtype=np.intp)
+        customers = instance.demand > 0
+        customers[self.depot] = False
+        self.unserved_count = int(customers.sum())
+
+    def copy(self):
+        solution = Solution.__new__(Solution)
+        solution.instance, solution.distances, solution.depot = self.instance, self.distances, self.depot
+        solution.routes = [route.copy() for route in self.routes]
+        solution.route_of = self.route_of.copy()
+        solution.position_of = self.position_of.copy()
+        solution.unserved_count = self.unserved_count
+        return solution
+
+    def restore(self, other):
+        """ Take the routes of other, a solution of the same instance (e.g. a changed copy), in place """
+        self.routes = other.routes
+        self.route_of = other.route_of
+        self.position_of = other.position_of
+        self.unserved_count = other.unserved_count
+
+    def add_route(self):
+        self.routes.append(Route())
+        return len(self.routes) - 1
+
+    def is_complete(self):
+        return self.unserved_count == 0
+
+    def is_served(self, node):
+        return self.route_of[node] != NOT_ASSIGNED
+
+    def remained_capacity(self, route_index):
+        return self.instance.truck_capacity - self.routes[route_index].load
+
+    def total_cost(self):
+        return sum(route.cost for route in self.routes)
+
+    def total_load(self):
+        return sum(route.load for route in self.routes)
+
+    def path(self, route_index):
+        """ Route nodes with the depot at the start and the end """
+        return np.concatenate(([self.depot], self.routes[route_index].sequence(), [self.depot]))
+
+    def sequence_cost(self, sequence):
+        """ Cost of visiting sequence (customers only) starting and ending at the depot """
+        if not len(sequence):
+            return 0
+        values = self.distances.values
+        sequence = np.asarray(sequence, dtype=np.intp)
+        return (values.item(self.depot, sequence[0]) + values[sequence[:-1], sequence[1:]].sum().item() +
+                values.item(sequence[-1], self.depot))
+
+    def sequence_costs(self, sequences):
+        """ Costs of a (B, L) array of candidate sequences (customers only), each starting and ending at the depot """
+        return self.distances.sequence_costs(sequences, self.depot)
+
+    def neighbors_of_position(self, route, position):
+        """ Return the nodes before and at position of route (depot at the ends) """
+        previous_node = route.nodes.item(position - 1) if position > 0 else self.depot
+        next_node = route.nodes.item(position) if position < route.length else self.depot
+        return previous_node, next_node
+
+    def assign(self, node, route_index, position):
+        if self.route_of[node] == NOT_ASSIGNED and self.instance.demand[node] > 0:
+            self.unserved_count -= 1
+        self.route_of[node] = route_index
+        self.position_of[node] = position
+
+    def unassign(self, node):
+        if self.route_of[node] != NOT_ASSIGNED and self.instance.demand[node] > 0:
+            self.unserved_count += 1
+        self.route_of[node] = NOT_ASSIGNED
+        self.position_of[node] = NOT_ASSIGNED
+
+    def append(self, route_index, node):
+        self.insert(route_index, len(self.routes[route_index]), node)
+
+    def insert(self, route_index, position, node):
+        route = self.routes[route_index]
+        values = self.distances.values
+        previous_node, next_node = self.neighbors_of_position(route, position)
+        route.cost += (values.item(previous_node, node) + values.item(node, next_node) -
+                       values.item(previous_node, next_node))
+        route.load += self.instance.demand.item(node)
+
+        route.reserve(route.length + 1)
+        route.nodes[position + 1:route.length + 1] = route.nodes[position:route.length]
+        route.nodes[position] = node
+        route.length += 1
+        self.assign(node, route_index, position)
+        self.position_of[route.nodes[position + 1:route.length]] = np.arange(position + 1, route.length)
+
+    def remove(self, node):
+        """ Remove node from its route and return (route_index, position) it had """
+        route_index, position = self.route_of.item(node), self.position_of.item(node)
+        route = self.routes[route_index]
+        values = self.distances.values
+        previous_node, _ = self.neighbors_of_position(route, position)
+        _, next_node = self.neighbors_of_position(route, position + 1)
+        route.cost += (values.item(previous_node, next_node) - values.item(previous_node, node) -
+                       values.item(node, next_node))
+        route.load -= self.instance.demand.item(node)
+
+        route.nodes[position:route.length - 1] = route.nodes[position + 1:route.length]
+        route.length -= 1
+        self.unassign(node)
+        self.position_of[route.nodes[position:route.length]] = np.arange(position, route.length)
+        return route_index, position
+
+    def set_sequence(self, route_index, sequence, cost=None):
+        """ Replace the customers of a route. cost can be given when the caller has already calculated it """
+        route = self.routes[route_index]
+        sequence = np.array(sequence, dtype=np.intp)
+        for node in route.sequence().tolist():
+            if self.route_of[node] == route_index:
+                self.unassign(node)
+        route.reserve(len(sequence))
+        route.nodes[:len(sequence)] = sequence
+        route.length = len(sequence)
+        route.load = self.instance.demand[sequence].sum().item()
+        route.cost = self.sequence_cost(sequence) if cost is None else cost
+        for position, node in enumerate(sequence.tolist()):
+            self.assign(node, route_index, position)
+
+    def set_sequences(self, route_indexes, sequences):
+        """ set_sequence for many routes. The sequences are padded with the depot (d(depot, depot) = 0) to the same
+        length, so all costs are calculated with one sequence_costs call
+        """
+        padded = np.full((len(sequences), max((len(sequence) for sequence in sequences), default=0)), self.depot,
+                         dtype=np.intp)
+        for row, sequence in enumerate(sequences):
+            padded[row, :len(sequence)] = sequence
+        for route_index, sequence, cost in zip(route_indexes, sequences, self.sequence_costs(padded).tolist()):
+            self.set_sequence(route_index, sequence, cost)
+
+    def drop_empty_routes(self):
+        """ Remove the routes without customers, the other routes get new indexes """
+        self.routes = [route for route in self.routes if route.length]
+        for route_index, route in enumerate(self.routes):
+            self.route_of[route.sequence()] = route_index
+
+    def flat_routes(self):
+        """ Return (flat_routes, route_starts) of the non empty routes, the input of solution_verifier """
+        sequences = [route.sequence() for route in self.routes if route.length]
+        if not sequences:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        route_starts = np.zeros(len(sequences), dtype=np.intp)
+        np.cumsum([len(sequence) for sequence in sequences[:-1]], out=route_starts[1:])
+        return np.concatenate(sequences), route_starts
@@ -0,0 +1,115 @@
+"""
+    Verifier for CVRP solutions. Routes are given as one flat array with the customers of all routes and the
+    start position of each route in it (depot not included), so loads and costs of all routes are calculated
+    with np.add.reduceat in one pass. It is cheap enough to run after every iteration of a search.
+"""
+import os
+
+import numpy as np
+
+import vrp_parser
+
+
+def flatten_routes(routes):
+    """
+    :param routes: iterable of node index sequences without the depot
+    :return: tuple (flat_routes, route_starts)
+
+    Empty routes are dropped, since they have no cost and no load.
+    """
+    routes = [route for route in routes if len(route)]
+    if not routes:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    route_lengths = np.fromiter((len(route) for route in routes), dtype=np.intp, count=len(routes))
+    route_starts = np.zeros(len(routes), dtype=np.intp)
+    np.cumsum(route_lengths[:-1], out=route_starts[1:])
+    return np.concatenate(routes).astype(np.intp), route_starts
+
+
+def verify_solution(instance, distances, flat_routes, route_starts, best_known_cost=None):
+    """
+    :param instance: vrp_parser.CVRPInstance
+    :param distances: distance_matrix.DistanceMatrix
+    :param flat_routes: numpy array with the customers of all routes
+    :param route_starts: numpy array with the position in flat_routes where each route starts
+    :param best_known_cost: number or None
+    :return: dict
+
+    Return route costs and loads, routes over capacity, unvisited and duplicate customers, routes that pass from
+    the depot, the number of routes over the trucks of the instance, whether the solution is feasible and its gap
+    (%) to best_known_cost. A solution with more routes than trucks is not feasible and its gap is not comparable,
+    so it is None.
+    """
+    depot = instance.depot
+    flat_routes = np.asarray(flat_routes, dtype=np.intp)
+    route_starts = np.asarray(route_starts, dtype=np.intp)
+    route_ends = np.append(route_starts[1:], len(flat_routes)) - 1
+
+    if len(flat_routes):
+        # previous node of each customer, the depot for the first customer of each route
+        previous_nodes = np.empty_like(flat_routes)
+        previous_nodes[1:] = flat_routes[:-1]
+        previous_nodes[route_starts] = depot
+        edge_costs = distances.values[previous_nodes, flat_routes]
+        route_costs = np.add.reduceat(edge_costs, route_starts) + distances.values[flat_routes[route_ends], depot]
+        route_loads = np.add.reduceat(instance.demand[flat_routes].astype(np.int64), route_starts)
+    else:
+        route_costs = np.empty(0, dtype=distances.values.dtype)
+        route_loads = np.empty(0, dtype=np.int64)
+
+    visits = np.bincount(flat_routes, minlength=len(instance))
+    customers = np.ones(len(instance), dtype=bool)
+    customers[depot] = False
+    route_of_position = np.repeat(np.arange(len(route_starts)), np.diff(np.append(route_starts, len(flat_routes))))
+
+    report = {
+        'total_cost': route_costs.sum().item(),
+        'route_costs': route_costs,
+        'route_loads': route_loads,
+        'capacity_violations': np.flatnonzero(route_loads > instance.truck_capacity),
+        'unvisited': np.flatnonzero(customers & (visits == 0)),
+        'duplicates': np.flatnonzero(customers & (visits > 1)),
+        'depot_visits': np.unique(route_of_position[flat_routes == depot]),
+        'route_count': len(route_starts),
+        'fleet_excess': max(len(route_starts) - instance.num_of_trucks, 0) if instance.num_of_trucks else 0,
+        'gap': None
+    }
+    report['feasible'] = not (len(report['capacity_violations']) or len(report['unvisited']) or
+                              len(report['duplicates']) or len(report['depot_visits']) or report['fleet_excess'])
+    if best_known_cost and not report['fleet_excess']:
+        report['gap'] = 100 * (report['total_cost'] - best_known_cost) / best_known_cost
+    return report
+
+
+def verify(solution, best_known_cost=None):
+    """ Verify a solution.Solution of the heuristics """
+    return verify_solution(solution.instance, solution.distances, *solution.flat_routes(), best_known_cost)
+
+
+def best_known_cost_of(file_name):
+    """ Return the cost of the .sol file next to the .vrp file, or None if there is no such file """
+    solution_file = file_name.split('.vrp')[0] + '.sol'
+    if not os.path.exists(solution_file):
+        return None
+    return vrp_parser.read_solution(solution_file)[1]
+
+
+def print_report(instance, report):
+    print('----SOLUTION VERIFICATION----')
+    print('Feasible: ', report['feasible'])
+    print('Total cost: ', report['total_cost'])
+    print('Routes: ', report['route_count'])
+    if report['fleet_excess']:
+        print('Routes over the {} trucks of the instance: {}, the gap to the best known solution is not '
+              'comparable'.format(instance.num_of_trucks, report['fleet_excess']))
+    if report['gap'] is not None:
+        print('Gap to best known solution: {:.2f}%'.format(report['gap']))
+    for route_index in report['capacity_violations']:
+        print('Route {} load {} is over capacity {}'.format(route_index, report['route_loads'][route_index],
+                                                          instance.truck_capacity))
+    if len(report['unvisited']):
+        print('Unvisited nodes: ', ' '.join(map(str, instance.node_ids[report['unvisited']])))
+    if len(report['duplicates']):
+        print('Nodes visited more than once: ', ' '.join(map(str, instance.node_ids[report['duplicates']])))
+    if len(report['depot_visits']):
+        print('Routes that pass from the depot: ', ' '.join(map(str, report['depot_visits'])))
@@ -0,0 +1,119 @@
+"""
+    Sweep construction heuristic.
+    Customers are sorted once by their polar angle around the depot. Starting from some angle, the sorted
+    customers are cut into routes: a route takes the next customers while their demand fits in the truck. The
+    cuts are found with binary search on the prefix sums of the demands, so each route costs O(log n) and the whole
+    heuristic is O(n log n).
+
+    Several rotated starting angles are tried. The customer order is the same for all of them, so the cost of each
+    rotation is the cost of the cyclic tour minus the edges cut between routes plus the edges to and from the depot,
+    and all rotations are evaluated together.
+
+    In order to run: python sweep_heuristic.py <file_name> [<rotations>]
+"""
+import sys
+
+import numpy as np
+
+import construction_heuristic as con_heu
+import solution_verifier
+import vrp_parser
+from distance_matrix import DistanceMatrix
+from solution import Solution
+
+SWEEP_ROTATIONS = 8
+
+
+def sweep_order(instance, customers):
+    """ Return customers and their polar angles around the depot, sorted by angle """
+    depot = instance.depot
+    angles = np.arctan2(instance.y[customers] - instance.y[depot], instance.x[customers] - instance.x[depot])
+    order = np.argsort(angles, kind='stable')
+    return customers[order], angles[order]
+
+
+def cut_routes(prefix_demands, start, length, capacity):
+    """
+    :param prefix_demands: numpy array, prefix sums of the demands of the sorted customers repeated twice
+    :param start: int, position of the first customer
+    :param length: int, number of customers
+    :param capacity: int
+    :return: numpy array with the start positions of the routes
+    """
+    route_starts = []
+    end = start + length
+    while start < end:
+        route_starts.append(start)
+        next_start = np.searchsorted(prefix_demands, prefix_demands[start] + capacity, side='right') - 1
+        # a customer with demand over capacity gets its own route
+        start = min(max(next_start, start + 1), end)
+    return np.array(route_starts, dtype=np.intp)
+
+
+def rotations_cost(distances, depot, ordered_customers, rotation_routes):
+    """
+    :param distances: distance_matrix.DistanceMatrix
+    :param depot: int
+    :param ordered_customers: numpy array, customers sorted by angle
+    :param rotation_routes: list with the route starts of each rotation, positions in the doubled customers order
+    :return: numpy array with the cost of each rotation
+    """
+    length = len(ordered_customers)
+    values = distances.values
+    cyclic_edges = values[ordered_customers, np.roll(ordered_customers, -1)]
+    route_starts = np.concatenate(rotation_routes) % length
+    # the last customer of each route is the one before the start of the next route (cyclic)
+    route_ends = (np.concatenate([np.roll(starts, -1) for starts in rotation_routes]) - 1) % length
+    rotation_of_route = np.repeat(np.arange(len(rotation_routes)), [len(starts) for starts in rotation_routes])
+
+    route_costs = (values[depot, ordered_customers[route_starts]].astype(np.float64) +
+                   values[ordered_customers[route_ends], depot] - cyclic_edges[route_ends])
+    return cyclic_edges.sum() + np.bincount(rotation_of_route, weights=route_costs,
+                                            minlength=len(rotation_routes))
+
+
+def generate_sweep_heuristic(instance, distances, rotations=SWEEP_ROTATIONS):
+    customers = np.flatnonzero(instance.demand > 0)
+    customers = customers[customers != instance.depot]
+    solution = Solution(instance, distances)
+    if not len(customers):
+        return solution
+    ordered_customers, angles = sweep_order(instance, customers)
+    length = len(ordered_customers)
+
+    prefix_demands = np.zeros(2 * length + 1, dtype=np.int64)
+    np.cumsum(np.tile(instance.demand[ordered_customers], 2), out=prefix_demands[1:])
+    start_angles = -np.pi + 2 * np.pi * np.arange(rotations) / rotations
+    starts = np.unique(np.searchsorted(angles, start_angles) % length)
+    rotation_routes = [cut_routes(prefix_demands, start, length, instance.truck_capacity) for start in starts]
+
+    best_rotation = np.argmin(rotations_cost(distances, instance.depot, ordered_customers, rotation_routes))
+    route_starts = rotation_routes[best_rotation]
+    route_ends = np.append(route_starts[1:], starts[best_rotation] + length)
+    routes = [ordered_customers[np.arange(route_start, route_end) % length]
+              for route_start, route_end in zip(route_starts.tolist(), route_ends.tolist())]
+    solution.set_sequences([solution.add_route() for _ in routes], routes)
+    return solution
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("In order to run: python sweep_heuristic.py <file_name> [<rotations>]")
+        return
+    file_name = sys.argv[1]
+    rotations = int(sys.argv[2]) if len(sys.argv) > 2 else SWEEP_ROTATIONS
+    instance = vrp_parser.main(file_name)
+    if not con_heu.check_file(instance):
+        print("File {} had problem so I skipped it".format(file_name))
+        return
+    distances = DistanceMatrix.from_instance(instance)
+    solution = generate_sweep_heuristic(instance, distances, rotations)
+
+    print('----SWEEP HEURISTIC SOLUTION----')
+    con_heu.print_results(instance, solution)
+    report = solution_verifier.verify(solution, solution_verifier.best_known_cost_of(file_name))
+    solution_verifier.print_report(instance, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+    Tabu search over the inter route moves of inter_route.py (relocate, swap, 2-opt*, cross-exchange).
+    Each iteration evaluates the moves of CANDIDATE_CUSTOMERS random customers with their nearest customers and
+    applies the best move that is not tabu, even if it makes the solution worse.
+
+    Tabu memory is a dict (customer, route) -> iteration until which the customer can not go back to the route it
+    was moved out of, so checking a move is O(1) per moved customer. Expired entries are dropped every
+    max tenure iterations, so the memory stays small however long the search runs. A tabu move is allowed when it
+    gives a solution better than the best one found (aspiration), which is known from its O(1) delta.
+
+    In order to run: python tabu_search.py <file_name> [<time_budget_secs>]
+"""
+import random
+import sys
+
+import construction_heuristic as con_heu
+import intra_route
+import solution_verifier
+from inter_route import InterRouteSearch, INTER_ROUTE_NEIGHBORS, EPSILON
+from search_controller import SearchController
+
+# a moved customer is tabu for a random number of iterations in this range
+TABU_TENURE = (10, 20)
+CANDIDATE_CUSTOMERS = 30
+ITERATIONS_PER_STEP = 100
+TIME_BUDGET = 60
+
+
+class TabuSearch:
+    def __init__(self, solution, tenure=TABU_TENURE, candidates=CANDIDATE_CUSTOMERS, neighbors=INTER_ROUTE_NEIGHBORS,
+                 seed=None):
+        """
+        :param solution: solution.Solution, it is changed in place
+        :param tenure: tuple (min, max) iterations
+        :param candidates: int, customers whose moves are evaluated in each iteration
+        :param neighbors: int, size of the candidate list of every customer
+        :param seed: int or None
+        """
+        self.solution = solution
+        self.search = InterRouteSearch(solution, neighbors)
+        self.tenure = tenure
+        self.candidates = candidates
+        self.random = random.Random(seed)
+        self.customers = self.search.customers.tolist()
+        self.current_cost = solution.total_cost()
+        self.best_cost = self.current_cost
+        self.iteration = 0
+        self.tabu_until = {}
+        self.controller = None
+
+    def is_tabu(self, moved_nodes):
+        return any(self.tabu_until.get((node, to_route), -1) > self.iteration for node, _, to_route in moved_nodes)
+
+    def make_tabu(self, moved_nodes):
+        for node, from_route, _ in moved_nodes:
+            self.tabu_until[(node, from_route)] = self.iteration + self.random.randint(*self.tenure)
+        if self.iteration % self.tenure[1] == 0:
+            self.tabu_until = {attribute: until for attribute, until in self.tabu_until.items()
+                               if until > self.iteration}
+
+    def iterate(self):
+        """ Apply the best allowed move of the candidate customers. Return False if there was no move at all """
+        if self.controller is not None:
+            self.best_cost = self.controller.best_cost
+        best = None
+        best_moved_nodes = None
+        for node in self.random.sample(self.customers, min(self.candidates, len(self.customers))):
+            for move in self.search.moves(node):
+                if best is not None and move[0] >= best[0]:
+                    continue
+                moved_nodes = self.search.moved_nodes(move[1], move[2])
+                aspiration = self.current_cost + move[0] < min(self.best_cost, self.current_cost) - EPSILON
+                if self.is_tabu(moved_nodes) and not aspiration:
+                    continue
+                best, best_moved_nodes = move, moved_nodes
+        self.iteration += 1
+        if best is None:
+            return False
+
+        delta, move_type, arguments = best
+        # the current solution may be the best one, keep it before leaving it
+        if delta > EPSILON and self.controller is not None and self.current_cost < self.best_cost - EPSILON:
+            self.controller.offer(self.solution)
+        for route_index in self.search.apply(move_type, arguments):
+            self.search.prefix_loads.pop(route_index, None)
+        self.make_tabu(best_moved_nodes)
+        self.current_cost += delta
+        return True
+
+    def step(self, solution, iterations=ITERATIONS_PER_STEP):
+        """ Run iterations. Return False when no customer has any move """
+        for _ in range(iterations):
+            if not self.iterate():
+                return False
+        self.current_cost = solution.total_cost()
+        return True
+
+
+def tabu_search(solution, time_budget=TIME_BUDGET, max_iterations=None, max_no_improvement=None, **tabu_options):
+    """
+    :param solution: solution.Solution, the start solution. It is changed in place
+    :param time_budget: secs or None
+    :param max_iterations: int or None, each iteration is ITERATIONS_PER_STEP tabu iterations
+    :param max_no_improvement: int or None, iterations without a new best solution
+    :param tabu_options: the options of TabuSearch
+    :return: tuple (SearchController, TabuSearch). The best solution is the best attribute of the controller
+    """
+    tabu = TabuSearch(solution, **tabu_options)
+    controller = SearchController(solution, time_budget, max_iterations, max_no_improvement)
+    tabu.controller = controller
+    controller.run(tabu.step)
+    controller.best.drop_empty_routes()
+    return controller, tabu
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("In order to run: python tabu_search.py <file_name> [<time_budget_secs>]")
+        return
+    file_name = sys.argv[1]
+    time_budget = float(sys.argv[2]) if len(sys.argv) > 2 else TIME_BUDGET
+
+    instance, distances, solution, value_to_improve = con_heu.main(file_name)
+    if instance and distances and solution and value_to_improve:
+        controller, tabu = tabu_search(solution, time_budget)
+        controller.print_summary()
+        print('Tabu iterations: {}, tabu attributes kept: {}'.format(tabu.iteration, len(tabu.tabu_until)))
+        # tabu search moves customers between routes, the order of each route is improved at the end
+        intra_route.improve_routes(controller.best)
+        print('----TABU SEARCH SOLUTION----')
+        con_heu.print_results(instance, controller.best)
+        report = solution_verifier.verify(controller.best, solution_verifier.best_known_cost_of(file_name))
+        solution_verifier.print_report(instance, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+    This script builds a catalog (csv index) of all CVRP instances in a directory, e.g. hw_1 with the A/B/F/M/P sets.
+    Each .vrp file is parsed in a process pool together with the .sol file of the same name, so benchmark drivers
+    can select instances and calculate optimality gaps from the index without reading the raw files again.
+
+    In order to run: python vrp_catalog.py <directory> [<index_file>]
+"""
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import vrp_parser
+
+CATALOG_FIELDS = ['name', 'dimension', 'capacity', 'trucks', 'total_demand', 'best_known_cost', 'best_known_routes',
+                  'vrp_file', 'vrp_hash', 'sol_file', 'sol_hash']
+DEFAULT_INDEX_FILE = 'vrp_catalog.csv'
+
+
+def find_instances(directory):
+    """ Return all .vrp (or .vrp.gz) files under directory, sorted by name """
+    instance_files = []
+    for dir_path, dir_names, file_names in os.walk(directory):
+        for file_name in file_names:
+            if file_name.endswith('.vrp') or file_name.endswith('.vrp.gz'):
+                instance_files.append(os.path.join(dir_path, file_name))
+    return sorted(instance_files)
+
+
+def solution_file_of(instance_file):
+    solution_file = instance_file[:-len('.vrp.gz')] if instance_file.endswith('.gz') else instance_file[:-len('.vrp')]
+    solution_file += '.sol'
+    return solution_file if os.path.exists(solution_file) else None
+
+
+def catalog_entry(instance_file):
+    instance = vrp_parser.read_file(instance_file)
+    if instance is None:
+        return None
+    entry = {
+        'name': instance.name or os.path.basename(instance_file).split('.')[0],
+        'dimension': instance.dimension,
+        'capacity': instance.truck_capacity,
+        'trucks': instance.num_of_trucks,
+        'total_demand': int(instance.demand.sum()),
+        'best_known_cost': None,
+        'best_known_routes': None,
+        'vrp_file': instance_file,
+        'vrp_hash': vrp_parser.file_hash(instance_file),
+        'sol_file': solution_file_of(instance_file),
+        'sol_hash': None
+    }
+    if entry['sol_file']:
+        routes, cost = vrp_parser.read_solution(entry['sol_file'])
+        entry['best_known_cost'] = cost
+        entry['best_known_routes'] = len(routes)
+        entry['sol_hash'] = vrp_parser.file_hash(entry['sol_file'])
+    return entry
+
+
+def build_catalog(directory, index_file=DEFAULT_INDEX_FILE, processes=None):
+    """
+    :param directory: string
+    :param index_file: string
+    :param processes: int, defaults to the number of cpus
+    :return: list
+
+    Parse all instances of directory in parallel, write their catalog to index_file and return its entries.
+    """
+    instance_files = find_instances(directory)
+    with ProcessPoolExecutor(processes) as executor:
+        entries = [entry for entry in executor.map(catalog_entry, instance_files, chunksize=8) if entry]
+
+    with open(index_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CATALOG_FIELDS)
+        writer.writeheader()
+        writer.writerows(entries)
+    return entries
+
+
+def read_catalog(index_file=DEFAULT_INDEX_FILE):
+    """ Return the catalog entries as dicts. Numeric fields are converted back to numbers, missing values are None """
+    entries = []
+    with open(index_file, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            for field, value in row.items():
+                if value == '':
+                    row[field] = None
+                elif field in ('dimension', 'capacity', 'trucks', 'total_demand', 'best_known_routes'):
+                    row[field] = int(value)
+                elif field == 'best_known_cost':
+                    row[field] = float(value)
+            entries.append(row)
+    return entries
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("In order to run: python vrp_catalog.py <directory> [<index_file>]")
+        return
+    index_file = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_INDEX_FILE
+    entries = build_catalog(sys.argv[1], index_file)
+    print("{} instances have been written to file '{}'".format(len(entries), index_file))
+
+
+if __name__ == '__main__':
+    main()
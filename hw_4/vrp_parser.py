@@ -2,106 +2,327 @@
     This script is a parser for problems from CVRPLIB (Capacitated Vehicle Routing Problem Library)
     http://vrp.galgos.inf.puc-rio.br/index.php/en
 
-    Some vrp files from other libraries might have TIME_WINDOW_SECTION, STAND_TIME_SECTION 
-    and PICKUP_SECTION. For those files you must add more while-loops in read_file function. 
+    Some vrp files from other libraries might have TIME_WINDOW_SECTION, STAND_TIME_SECTION
+    and PICKUP_SECTION. For those files you must add more sections in read_file function.
+    Gzip compressed files (.vrp.gz) are read directly.
+
+    Parsed instances can be cached: main(file_name, cache_dir) (or the VRP_CACHE_DIR environment variable)
+    stores the instance arrays as .npy files in a directory named after the file's hash and PARSER_VERSION.
+    Next runs map these arrays with np.load(mmap_mode='r') instead of parsing the text again.
 """
+import gzip
+import hashlib
+import json
+import os
 import re
+import shutil
+from collections.abc import Mapping
 
+import numpy as np
 
-def read_file(file_name):
-    header = []
-    node_coord = []
-    node_coord_section_found = False
-    demands = []
-    demands_section_found = False
-    depot = []
-    depot_section_found = False
+from distance_matrix import DEFAULT_EDGE_WEIGHT_TYPE
+
+# change it whenever CVRPInstance arrays change, so old cache entries are not used
+PARSER_VERSION = '3'
+CACHE_DIR_VARIABLE = 'VRP_CACHE_DIR'
+CACHED_ARRAYS = ('node_ids', 'x', 'y', 'demand')
+
+
+def open_file(file_name):
+    """ Open a .vrp file as text. Files ending in .gz are decompressed while we read them. """
     try:
-        with open(file_name, 'r') as f:
-            file_data = f.read()
+        if file_name.endswith('.gz'):
+            return gzip.open(file_name, 'rt')
+        return open(file_name, 'r')
     except FileNotFoundError:
         raise FileNotFoundError("File %s not found" % file_name)
 
-    # check which of the supported sections are in our file
-    if 'NODE_COORD_SECTION' in file_data: node_coord_section_found = True
-    if 'DEMAND_SECTION' in file_data: demands_section_found = True
-    if 'DEPOT_SECTION' in file_data: depot_section_found = True
-    if 'EOF' not in file_data: raise EOFError('EOF not found')
 
-    iterator = iter(file_data.split('\n'))
-    while True:
-        try:
-            line = next(iterator)
-
-            # read header
-            while 'NODE_COORD_SECTION' not in line and 'DEMAND_SECTION' not in line and \
-                    'DEPOT_SECTION' not in line and 'EOF' not in line:
-                header.append(line.split())
-                line = next(iterator)
-
-            if node_coord_section_found and 'NODE_COORD_SECTION' in line:
-                # read coords
-                line = next(iterator)
-                while 'DEMAND_SECTION' not in line and 'DEPOT_SECTION' not in line and 'EOF' not in line:
-                    node_coord.append(line.split())
-                    line = next(iterator)
-
-            if demands_section_found and 'DEMAND_SECTION' in line:
-                # read demands
-                line = next(iterator)
-                while 'NODE_COORD_SECTION' not in line and 'DEPOT_SECTION' not in line and 'EOF' not in line:
-                    demands.append(line.split())
-                    line = next(iterator)
-
-            if depot_section_found and 'DEPOT_SECTION' in line:
-                # read depot
-                line = next(iterator)
-                depot.append(line.split())  # <dep_id> or <x-coord> <y-coord>
+def add_row(buffer, count, values):
+    """ Store values at row count. The buffer doubles when DIMENSION was missing or wrong. """
+    if count == len(buffer):
+        buffer = np.concatenate((buffer, np.empty_like(buffer)))
+    buffer[count] = values
+    return buffer
+
+
+def read_file(file_name):
+    """
+    :param file_name: string
+    :return: CVRPInstance
+
+    Read the file line by line. The current section is our only state, so every line is tested once and
+    coords/demands go straight into arrays, which are preallocated when DIMENSION is in the header.
+    """
+    header = []
+    section = None
+    node_coord = demands = None
+    coords_count = demands_count = 0
+    depot = []
+    eof_found = False
+
+    with open_file(file_name) as f:
+        for line in f:
+            line_values = line.split()
+            if not line_values:
+                continue
+            keyword = line_values[0]
+
+            if keyword == 'EOF':
+                eof_found = True
                 break
+            if keyword.endswith('_SECTION'):
+                section = keyword
+                if node_coord is None:
+                    buffer_size = max(handle_header(header).get('dimension', 0), 1)
+                    node_coord = np.empty((buffer_size, 3), dtype=np.float64)
+                    demands = np.empty((buffer_size, 2), dtype=np.int64)
+                continue
 
-        except StopIteration:
-            break
+            if section is None:
+                header.append(line_values)
+            elif section == 'NODE_COORD_SECTION':
+                # <id> <x-coord> <y-coord>
+                node_coord = add_row(node_coord, coords_count, [float(value) for value in line_values[:3]])
+                coords_count += 1
+            elif section == 'DEMAND_SECTION':
+                # demand section data can be either <id> <dem> or <id> <weight> <vol>
+                demands = add_row(demands, demands_count, [int(line_values[0]), int(line_values[1])])
+                demands_count += 1
+            elif section == 'DEPOT_SECTION':
+                # <dep_id> lines terminated by -1
+                if keyword != '-1':
+                    depot.append(int(keyword))
+            # other sections (e.g. TIME_WINDOW_SECTION) are not supported, so their lines are skipped
 
-    if len(header) and len(node_coord) and len(demands) and len(depot):
-        return (
+    if not eof_found:
+        raise EOFError('EOF not found')
+
+    if len(header) and coords_count and demands_count and len(depot):
+        node_ids, x, y = handle_coords(node_coord[:coords_count])
+        return CVRPInstance(
             handle_header(header),
-            handle_coords(node_coord),
-            handle_demand(demands),
-            float(depot[0][0])
+            node_ids, x, y,
+            handle_demand(demands[:demands_count], node_ids),
+            node_index(node_ids, depot[0])
         )
     else:
         print("Something went wrong with file parsing.")
 
 
+class CVRPInstance:
+    """
+        Parsed CVRP file. Nodes are remapped to 0..n-1 following the order of their ids in the file, so every
+        heuristic can index numpy arrays with them. node_ids keeps the original ids (e.g. for printing routes).
+    """
+
+    def __init__(self, header, node_ids, x, y, demand, depot, cache_path=None):
+        self.header = header
+        self.name = header.get('name')
+        self.dimension = header.get('dimension', len(node_ids))
+        self.truck_capacity = header.get('truck_capacity')
+        self.num_of_trucks = header.get('num_of_trucks')
+        self.edge_weight_type = header.get('edge_weight_type', DEFAULT_EDGE_WEIGHT_TYPE)
+        self.node_ids = node_ids
+        self.x = x
+        self.y = y
+        self.demand = demand
+        self.depot = depot
+        # directory of the cached arrays, DistanceMatrix.from_instance stores the distances there too
+        self.cache_path = cache_path
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def legacy_view(self):
+        """
+        :return: tuple
+
+        Return the old (header, node_coords, demands, depot) interface, where node_coords and demands behave like
+        dicts keyed by float(node_id). Demands are a copy, since the old heuristics zero them while they run.
+        """
+        header = {key: self.header[key] for key in ('num_of_trucks', 'truck_capacity', 'edge_weight_type')
+                  if key in self.header}
+        return (
+            header,
+            NodeCoordsView(self.node_ids, self.x, self.y),
+            DemandsView(self.node_ids, self.demand.copy()),
+            float(self.node_ids[self.depot])
+        )
+
+
+class _NodeView(Mapping):
+    """ Read only dict interface over the instance arrays, keyed by float(node_id) """
+
+    def __init__(self, node_ids):
+        self._node_ids = node_ids
+
+    def _index(self, node_id):
+        try:
+            return node_index(self._node_ids, node_id)
+        except ValueError:
+            raise KeyError(node_id)
+
+    def __iter__(self):
+        return iter(self._node_ids.astype(float).tolist())
+
+    def __len__(self):
+        return len(self._node_ids)
+
+
+class NodeCoordsView(_NodeView):
+    def __init__(self, node_ids, x, y):
+        super().__init__(node_ids)
+        self._x = x
+        self._y = y
+
+    def __getitem__(self, node_id):
+        index = self._index(node_id)
+        return {'x': self._x.item(index), 'y': self._y.item(index)}
+
+
+class DemandsView(_NodeView):
+    def __init__(self, node_ids, demand):
+        super().__init__(node_ids)
+        self._demand = demand
+
+    def __getitem__(self, node_id):
+        return float(self._demand.item(self._index(node_id)))
+
+    def __setitem__(self, node_id, value):
+        self._demand[self._index(node_id)] = value
+
+
 def handle_header(header):
     header_data = {}
     for header_line in header:
-        if header_line[0] == 'COMMENT':
+        if not header_line:
+            continue
+        # both 'KEY : value' and 'KEY: value' are used
+        key = header_line[0].rstrip(':')
+        if key == 'COMMENT':
             # a silly way to find easily the number of trucks
             for index, value in enumerate(header_line):
                 if value == 'trucks:':
                     header_data['num_of_trucks'] = int(re.findall(r'\d+', header_line[index + 1].split(',')[0])[0])
-        if header_line[0] == 'CAPACITY':
-            header_data['truck_capacity'] = int(header_line[2])
-            break
+        elif key == 'NAME':
+            header_data['name'] = header_line[-1]
+        elif key == 'DIMENSION':
+            header_data['dimension'] = int(header_line[-1])
+        elif key == 'EDGE_WEIGHT_TYPE':
+            header_data['edge_weight_type'] = header_line[-1]
+        elif key == 'CAPACITY':
+            header_data['truck_capacity'] = int(header_line[-1])
     return header_data
 
 
 def handle_coords(coords):
-    # <id> <x-coord> <y-coord> 
-    coords_data = {}
-    for coord_item in coords:
-        coords_data[float(coord_item[0])] = {'x': float(coord_item[1]), 'y': float(coord_item[2])}
-    return coords_data
-
-
-def handle_demand(demands):
-    # demand section data can be either <id> <dem> or <id> <weight> <vol>
-    demands_data = {}
-    for demand in demands:
-        demands_data[float(demand[0])] = float(demand[1])
+    # rows of <id> <x-coord> <y-coord>, sorted by id
+    coords = coords[np.argsort(coords[:, 0], kind='stable')]
+    return coords[:, 0].astype(np.int32), coords[:, 1].copy(), coords[:, 2].copy()
+
+
+def handle_demand(demands, node_ids):
+    # rows of <id> <dem>
+    demands_data = np.zeros(len(node_ids), dtype=np.int32)
+    indexes = np.searchsorted(node_ids, demands[:, 0])
+    unknown_nodes = (indexes == len(node_ids)) | (node_ids[np.minimum(indexes, len(node_ids) - 1)] != demands[:, 0])
+    if unknown_nodes.any():
+        raise ValueError("Node %s has no coords" % demands[unknown_nodes][0, 0])
+    demands_data[indexes] = demands[:, 1]
     return demands_data
 
 
-def main(file_name):
+def read_solution(file_name):
+    """
+    :param file_name: string
+    :return: tuple
+
+    Read a CVRPLIB .sol file and return its routes and cost (None if the file has no cost line).
+    Customers keep the numbering of the file, where the depot is 0. For CVRPLIB instances (depot id 1 and
+    node ids 1..n) customer k is node index k of CVRPInstance.
+    """
+    routes = []
+    cost = None
+    with open_file(file_name) as f:
+        for line in f:
+            line_values = line.split()
+            if not line_values:
+                continue
+            if line_values[0] == 'Route':
+                # Route #<k>: <customer> <customer> ...
+                routes.append([int(value) for value in line.split(':', 1)[1].split()])
+            elif line_values[0].lower() == 'cost':
+                cost = float(line_values[1])
+                if cost.is_integer():
+                    cost = int(cost)
+    return routes, cost
+
+
+def node_index(node_ids, node_id):
+    """ Return the 0..n-1 index of an original node id """
+    index = int(np.searchsorted(node_ids, node_id))
+    if index == len(node_ids) or node_ids[index] != node_id:
+        raise ValueError("Node %s has no coords" % node_id)
+    return index
+
+
+def file_hash(file_name):
+    """ Return the sha1 of the file's bytes """
+    digest = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path_of(file_name, cache_dir):
+    name = os.path.basename(file_name).split('.')[0]
+    return os.path.join(cache_dir, '{}-{}-v{}'.format(name, file_hash(file_name), PARSER_VERSION))
+
+
+def write_cache(instance, cache_path):
+    # write everything in a temporary directory and rename it, so other processes never see half a cache entry
+    temp_path = '{}.tmp{}'.format(cache_path, os.getpid())
+    os.makedirs(temp_path, exist_ok=True)
+    for array_name in CACHED_ARRAYS:
+        np.save(os.path.join(temp_path, array_name + '.npy'), getattr(instance, array_name))
+    with open(os.path.join(temp_path, 'header.json'), 'w') as f:
+        json.dump({'header': instance.header, 'depot': instance.depot}, f)
+    try:
+        os.rename(temp_path, cache_path)
+    except OSError:
+        # another process cached the same file first
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+
+def read_cache(cache_path):
+    with open(os.path.join(cache_path, 'header.json'), 'r') as f:
+        cached_data = json.load(f)
+    arrays = [np.load(os.path.join(cache_path, array_name + '.npy'), mmap_mode='r') for array_name in CACHED_ARRAYS]
+    return CVRPInstance(cached_data['header'], *arrays, cached_data['depot'], cache_path=cache_path)
+
+
+def read_cached_file(file_name, cache_dir):
+    """
+    :param file_name: string
+    :param cache_dir: string
+    :return: CVRPInstance
+
+    Return the cached instance of the file, parsing and caching it first if needed. Arrays are read only memmaps.
+    """
+    cache_path = cache_path_of(file_name, cache_dir)
+    if not os.path.isdir(cache_path):
+        instance = read_file(file_name)
+        if instance is None:
+            return None
+        os.makedirs(cache_dir, exist_ok=True)
+        write_cache(instance, cache_path)
+    return read_cache(cache_path)
+
+
+def main(file_name, cache_dir=None):
+    cache_dir = cache_dir or os.environ.get(CACHE_DIR_VARIABLE)
+    if cache_dir:
+        return read_cached_file(file_name, cache_dir)
     return read_file(file_name)
@@ -1,136 +1,169 @@
-import operator
 import random
+import time
 
+import numpy as np
+
+import fleet_size
 import vrp_parser
+from distance_matrix import DistanceMatrix
+from restricted_candidate_list import RestrictedCandidateList, value_based_rcl
+from spatial_index import GridIndex
 
+# only the nearest unserved customers that fit in the truck are evaluated as its next node
+NEIGHBORS_TO_EVALUATE = 32
+# None: the RCL has the GRASP_LIST_SIZE best nodes, otherwise the nodes within alpha of the best score
+GRASP_ALPHA = None
 
-def calculate_manhattan_distance(from_node, to_note, node_coords):
-    return (abs(node_coords[from_node]['x'] - node_coords[to_note]['x']) +
-            abs(node_coords[from_node]['y'] - node_coords[to_note]['y']))
 
+def find_next_node(current_node, distances, demands, truck, spatial_index):
+    candidates = spatial_index.nearest(current_node, NEIGHBORS_TO_EVALUATE, demands, truck['remained_capacity'])
+    if not len(candidates):
+        return None, None
+    cost_values = demands[candidates] / distances.values[current_node, candidates]
 
-def update_acceptable_nodes(best_values, node_id, new_value):
-    best_values_sorted = sorted(best_values, key=operator.itemgetter(1))
-    if GRASP_LIST_SIZE > len(best_values_sorted):
-        best_values_sorted.append([node_id, new_value])
-        return best_values_sorted
-    else:
-        if best_values_sorted[len(best_values_sorted) - 1][0] > new_value:
-            best_values_sorted[len(best_values_sorted) - 1] = [node_id, new_value]
-        return best_values_sorted
-
-
-def find_next_node(current_node, node_coords, demands, truck):
-    best_val = []
-    for node_id, demand in demands.items():
-        if node_id != current_node and demand and truck['remained_capacity'] > demand:
-            manhattan_distance = calculate_manhattan_distance(current_node, node_id, node_coords)
-            cost_value = demand / manhattan_distance
-            best_val = update_acceptable_nodes(best_val, node_id, cost_value)
-
-    if len(best_val) > 0:
-        selected_next_node = random.choice(best_val)
-        return selected_next_node[0], selected_next_node[1]
+    if GRASP_ALPHA is None:
+        best_val = RestrictedCandidateList(GRASP_LIST_SIZE)
+        for node_id, cost_value in zip(candidates.tolist(), cost_values.tolist()):
+            best_val.push(node_id, cost_value)
+        selected_next_node = best_val.choice()
     else:
-        return None, None
+        selected_next_node = random.choice(value_based_rcl(candidates, cost_values, GRASP_ALPHA).tolist())
+    return selected_next_node, distances.distance(current_node, selected_next_node)
 
 
-def calculate_path_truck(first_node_to_visit, node_coords, demands, depot, truck):
+def calculate_path_truck(first_node_to_visit, distances, demands, depot, truck, spatial_index):
     current_node = depot
     # some calculations for the first node that each track will visit
     if demands[first_node_to_visit] != 0:
+        demand = demands.item(first_node_to_visit)
         truck['notes_visited'].append(first_node_to_visit)
-        truck['remained_capacity'] -= demands[first_node_to_visit]
-        truck['demand_covered'] += demands[first_node_to_visit]
-        truck['distance_made'] += calculate_manhattan_distance(current_node, first_node_to_visit, node_coords)
+        truck['remained_capacity'] -= demand
+        truck['demand_covered'] += demand
+        truck['distance_made'] += distances.distance(current_node, first_node_to_visit)
         demands[first_node_to_visit] = 0
+        spatial_index.remove(first_node_to_visit)
         current_node = first_node_to_visit
 
     # the rest nodes that each track will visit
     while truck['remained_capacity']:
-        current_node, distance_made = find_next_node(current_node, node_coords, demands, truck)
+        current_node, distance_made = find_next_node(current_node, distances, demands, truck, spatial_index)
         if current_node is None:
             current_node = truck['notes_visited'][len(truck['notes_visited']) - 1]
             break
+        demand = demands.item(current_node)
         truck['notes_visited'].append(current_node)
-        truck['remained_capacity'] -= demands[current_node]
-        truck['demand_covered'] += demands[current_node]
+        truck['remained_capacity'] -= demand
+        truck['demand_covered'] += demand
         truck['distance_made'] += distance_made
         demands[current_node] = 0
+        spatial_index.remove(current_node)
 
     # return to depot
     truck['notes_visited'].append(depot)
-    truck['distance_made'] += calculate_manhattan_distance(current_node, depot, node_coords)
+    truck['distance_made'] += distances.distance(current_node, depot)
+
 
+def deadline_passed(deadline):
+    return deadline is not None and time.time() >= deadline
 
-def generate_construction_heuristic(header, node_coords, demands, depot):
-    number_of_trucks = header['num_of_trucks']
-    global GRASP_LIST_SIZE
+
+def generate_construction_heuristic(instance, distances, alpha=None, fleet=None, deadline=None):
+    """
+    :param fleet: dict of fleet_size.analyse_fleet, it is calculated (and its diagnosis printed) when not given
+    :param deadline: time.time() value or None. When it passes no more trucks are added, so the trucks returned
+    may not serve all customers
+    :return: dict with the trucks, or None when the instance can not be solved
+    """
+    if fleet is None:
+        fleet = fleet_size.analyse_fleet(instance)
+        for message in fleet['diagnosis']:
+            print(message)
+    if len(fleet['oversized']):
+        return None
+    number_of_trucks = fleet['trucks']
+    depot = instance.depot
+    demands = instance.demand.copy()
+    spatial_index = GridIndex(instance.x, instance.y, demands > 0, instance.edge_weight_type)
+    global GRASP_LIST_SIZE, GRASP_ALPHA
     GRASP_LIST_SIZE = 8
-    if len(node_coords) < 8:
-        if len(node_coords) < number_of_trucks:
+    GRASP_ALPHA = alpha
+    if len(instance) < 8:
+        if len(instance) < number_of_trucks:
             raise IOError("There is an error with datas")
-        GRASP_LIST_SIZE = len(node_coords)
+        GRASP_LIST_SIZE = len(instance)
 
     trucks = {}
-    # calculate the distance from depot for all nodes
-    distances = []
-    for node_id, node in node_coords.items():
-        if node_id == depot:
-            continue
-        distances.append([node_id, calculate_manhattan_distance(depot, node_id, node_coords)])
-    distances.sort(key=operator.itemgetter(1))
-
-    # select first 5 nodes as first step for each truck
-    first_steps_acceptable = [distances[index][0] for index in range(GRASP_LIST_SIZE)]
-    first_steps = random.sample(first_steps_acceptable, number_of_trucks)
-    while not all(remained_demand == 0 for node_id, remained_demand in demands.items()):
-        for truck_id in range(number_of_trucks):
-            trucks[truck_id] = {
-                'remained_capacity': header['truck_capacity'],
+    # sort all nodes by their distance from depot
+    nodes_by_depot_distance = np.argsort(distances.values[depot], kind='stable')
+    nodes_by_depot_distance = nodes_by_depot_distance[nodes_by_depot_distance != depot]
+
+    # select a random node among the nearest ones as first step for each truck
+    first_steps_acceptable = nodes_by_depot_distance[:max(GRASP_LIST_SIZE, number_of_trucks)].tolist()
+    first_steps = random.sample(first_steps_acceptable, min(number_of_trucks, len(first_steps_acceptable)))
+    while demands.any() and not deadline_passed(deadline):
+        remained_demand = demands.sum()
+        for first_step in first_steps:
+            if deadline_passed(deadline) or not demands.any():
+                break
+            truck = {
+                'remained_capacity': instance.truck_capacity,
                 'notes_visited': [depot],
                 'demand_covered': 0,
                 'distance_made': 0
             }
-            calculate_path_truck(first_steps[truck_id], node_coords, demands, depot, trucks[truck_id])
+            trucks[len(trucks)] = truck
+            calculate_path_truck(first_step, distances, demands, depot, truck, spatial_index)
+        if demands.sum() == remained_demand and not deadline_passed(deadline):
+            print('No truck could serve the remaining demand {}'.format(remained_demand))
+            break
 
-    return trucks
+    # a truck whose first step was already served may find no node that fits
+    trucks = [truck for truck in trucks.values() if truck['demand_covered']]
+    message = fleet_size.route_count_diagnosis(fleet, len(trucks))
+    if message:
+        print(message)
+    return dict(enumerate(trucks))
 
 
-def print_results(trucks):
+def print_results(instance, trucks):
     total_demand = 0
     total_distance_made = 0
     for truck_id, truck in trucks.items():
         total_demand += truck['demand_covered']
         total_distance_made += truck['distance_made']
-        print("Truck {} path: {}".format(str(truck_id), ' '.join(map(str, truck['notes_visited']))))
+        path = instance.node_ids[truck['notes_visited']]
+        print("Truck {} path: {}".format(str(truck_id), ' '.join(map(str, path))))
 
     print("Total distance made: ", total_distance_made)
     print('The amount of demand that we covered: ', total_demand)
     return total_distance_made
 
 
-def check_file(node_coords):
+def check_file(instance):
     """
         This function checks if there are two nodes in the same coords. If yes, we can't use this file since
-        manhattan distance for this nodes is zero and this will raise an ZeroDivisionError at find_next_node function
+        their distance is zero and this will raise an ZeroDivisionError at find_next_node function
     """
-    unique_nodes = set([(coords['x'], coords['y']) for node_id, coords in node_coords.items()])
-    return len(unique_nodes) == len(node_coords)
+    unique_nodes = np.unique(np.column_stack((instance.x, instance.y)), axis=0)
+    return len(unique_nodes) == len(instance)
 
 
 def main():
     # file_name = '../hw_1/A/A-n38-k5.vrp'
     file_name = input("Give file's name\n")
-    header, node_coords, demands, depot = vrp_parser.main(file_name)
+    instance = vrp_parser.main(file_name)
     # check if file is ok
-    file_is_ok = check_file(node_coords)
+    file_is_ok = check_file(instance)
     if file_is_ok:
-        trucks = generate_construction_heuristic(header, node_coords, demands, depot)
+        distances = DistanceMatrix.from_instance(instance)
+        trucks = generate_construction_heuristic(instance, distances)
+        if trucks is None:
+            print("File {} can not be solved".format(file_name))
+            return
 
         # print construction heuristic solution
         print('----CONSTRUCTION HEURISTIC SOLUTION----')
-        print_results(trucks)
+        print_results(instance, trucks)
     else:
         print("File {} had problem so I skipped it".format(file_name))
 
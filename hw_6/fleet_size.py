@@ -0,0 +1,75 @@
+"""
+    Fleet size analysis, run before the construction heuristics.
+    Routing customers into trucks is at least as hard as packing their demands into bins of the truck capacity, so
+    bin packing bounds give the trucks that are needed:
+    lower bound - max(ceil(total demand / capacity), customers with demand over half the capacity), since no two
+                  such customers fit in the same truck
+    upper bound - trucks used by first fit decreasing (FFD), a packing that surely exists
+    Customers with demand over the capacity can not be served at all.
+"""
+import numpy as np
+
+
+def lower_bound(demands, capacity):
+    total_demand = int(demands.sum())
+    return max(-(-total_demand // capacity), int(np.count_nonzero(2 * demands > capacity)))
+
+
+def first_fit_decreasing(demands, capacity):
+    """ Return the number of trucks FFD needs. Demands over the capacity must have been removed """
+    remained_capacity = np.full(len(demands), capacity, dtype=np.int64)
+    trucks_used = 0
+    for demand in np.sort(demands)[::-1].tolist():
+        truck = int(np.argmax(remained_capacity[:trucks_used] >= demand)) if trucks_used else 0
+        if not trucks_used or remained_capacity[truck] < demand:
+            truck = trucks_used
+            trucks_used += 1
+        remained_capacity[truck] -= demand
+    return trucks_used
+
+
+def analyse_fleet(instance):
+    """
+    :param instance: vrp_parser.CVRPInstance
+    :return: dict
+
+    Return the total demand, the lower and upper bound of trucks, the customers with demand over the capacity,
+    the trucks the construction should use and a list of messages that explain any problem that was found.
+    The number of trucks of the file is used when it is enough, otherwise the FFD number.
+    """
+    capacity = instance.truck_capacity
+    customers = np.flatnonzero(instance.demand > 0)
+    customers = customers[customers != instance.depot]
+    demands = instance.demand[customers].astype(np.int64)
+    oversized = customers[demands > capacity]
+    demands = demands[demands <= capacity]
+
+    fleet = {
+        'total_demand': int(demands.sum()),
+        'lower_bound': lower_bound(demands, capacity),
+        'upper_bound': first_fit_decreasing(demands, capacity),
+        'oversized': oversized,
+        'trucks': instance.num_of_trucks,
+        'diagnosis': []
+    }
+    if len(oversized):
+        fleet['diagnosis'].append('Nodes with demand over the truck capacity {}: {}'.format(
+            capacity, ' '.join(map(str, instance.node_ids[oversized]))))
+    if instance.num_of_trucks is None:
+        fleet['trucks'] = fleet['upper_bound']
+        fleet['diagnosis'].append('The file does not give the number of trucks, {} trucks are used'.format(
+            fleet['trucks']))
+    elif instance.num_of_trucks < fleet['lower_bound']:
+        fleet['trucks'] = fleet['upper_bound']
+        fleet['diagnosis'].append('{} trucks of the file can not carry the total demand {}, at least {} are needed. '
+                                  '{} trucks are used'.format(instance.num_of_trucks, fleet['total_demand'],
+                                                              fleet['lower_bound'], fleet['trucks']))
+    return fleet
+
+
+def route_count_diagnosis(fleet, route_count):
+    """ Return the diagnosis of a construction that needed more routes than the trucks of fleet, or None """
+    if route_count <= fleet['trucks']:
+        return None
+    return 'The construction needed {} routes, more than the {} trucks (the demand needs at least {})'.format(
+        route_count, fleet['trucks'], fleet['lower_bound'])
@@ -0,0 +1,158 @@
+"""
+    This script runs many independent GRASP constructions (construction_heuristic.py) in a process pool and keeps
+    the best solution. Each start has its own seed. Instance arrays and the distance matrix are put once in
+    shared memory and every worker maps them, instead of receiving a pickled copy with each start.
+    Every start gets the deadline of the time budget and stops adding trucks when it passes, so the pool finishes
+    on time and a start that was cut keeps its partial result.
+
+    In order to run: python multi_start_grasp.py <file_name> [<starts> <time_budget_secs> <alpha>]
+"""
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import construction_heuristic as con_heu
+import fleet_size
+import vrp_parser
+from distance_matrix import DistanceMatrix, CoordinateDistances
+
+SHARED_ARRAYS = ('node_ids', 'x', 'y', 'demand')
+
+# set in every worker by attach_shared_data
+worker_data = {}
+
+
+def share_array(array, shared_blocks):
+    """ Copy array to a new shared memory block and return what a worker needs to map it """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared_blocks.append(block)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block.name, array.shape, array.dtype.str
+
+
+def map_array(block_name, shape, dtype, blocks):
+    block = shared_memory.SharedMemory(name=block_name)
+    blocks.append(block)  # the block must stay open while the array is used
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def attach_shared_data(header, depot, shared_arrays, shared_distances, edge_weight_type, fleet):
+    blocks = []
+    arrays = {name: map_array(*shared_arrays[name], blocks) for name in SHARED_ARRAYS}
+    instance = vrp_parser.CVRPInstance(header, arrays['node_ids'], arrays['x'], arrays['y'], arrays['demand'], depot)
+    if shared_distances is None:
+        distances = DistanceMatrix(CoordinateDistances(instance.x, instance.y, edge_weight_type), edge_weight_type)
+    else:
+        distances = DistanceMatrix(map_array(*shared_distances, blocks), edge_weight_type)
+    worker_data.update(instance=instance, distances=distances, fleet=fleet, blocks=blocks)
+
+
+def run_start(seed, alpha, deadline):
+    start_time = time.time()
+    random.seed(seed)
+    instance = worker_data['instance']
+    trucks = con_heu.generate_construction_heuristic(instance, worker_data['distances'], alpha, worker_data['fleet'],
+                                                    deadline)
+    demand_covered = sum(truck['demand_covered'] for truck in trucks.values())
+    return {
+        'seed': seed,
+        'cost': sum(truck['distance_made'] for truck in trucks.values()),
+        'demand_covered': demand_covered,
+        'complete': demand_covered == instance.demand.sum().item(),
+        'trucks': trucks,
+        'time': time.time() - start_time,
+        'pid': os.getpid()
+    }
+
+
+def multi_start_grasp(instance, distances, starts, time_budget=None, alpha=None, master_seed=None, processes=None):
+    """
+    :param instance: vrp_parser.CVRPInstance
+    :param distances: distance_matrix.DistanceMatrix
+    :param starts: int, number of GRASP constructions
+    :param time_budget: secs or None. Starts that have not begun when it ends are cancelled, running starts stop
+    and return the trucks they have made
+    :param alpha: None for the cardinality based RCL, otherwise the alpha of the value based RCL
+    :param master_seed: int, the seed of each start is derived from it
+    :param processes: int, defaults to the number of cpus
+    :return: tuple (best start, list with the statistics of all finished starts). The best start is the complete
+    one with the min cost, or the partial one that covered the most demand when no start is complete
+    """
+    fleet = fleet_size.analyse_fleet(instance)
+    for message in fleet['diagnosis']:
+        print(message)
+    if len(fleet['oversized']):
+        return None, []
+    seeds = random.Random(master_seed).sample(range(2 ** 31), starts)
+    shared_blocks = []
+    deadline = None if time_budget is None else time.time() + time_budget
+    results = []
+    try:
+        shared_arrays = {name: share_array(np.asarray(getattr(instance, name)), shared_blocks)
+                         for name in SHARED_ARRAYS}
+        shared_distances = None
+        if isinstance(distances.values, np.ndarray):
+            shared_distances = share_array(np.asarray(distances.values), shared_blocks)
+
+        executor = ProcessPoolExecutor(processes, initializer=attach_shared_data,
+                                       initargs=(instance.header, instance.depot, shared_arrays, shared_distances,
+                                                 distances.edge_weight_type, fleet))
+        pending = {executor.submit(run_start, seed, alpha, deadline) for seed in seeds}
+        while pending:
+            timeout = None if deadline is None else max(deadline - time.time(), 0)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            results.extend(future.result() for future in done)
+            if deadline is not None and time.time() >= deadline:
+                break
+        # running starts stop at the deadline, so waiting for them takes at most one truck more
+        executor.shutdown(wait=True, cancel_futures=True)
+        results.extend(future.result() for future in pending if not future.cancelled())
+    finally:
+        for block in shared_blocks:
+            block.close()
+            block.unlink()
+
+    results = [result for result in results if result['trucks']]
+    if not results:
+        return None, results
+    best = min(results, key=lambda result: (not result['complete'], -result['demand_covered'], result['cost']))
+    statistics = [{key: value for key, value in result.items() if key != 'trucks'} for result in results]
+    return best, statistics
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("In order to run: python multi_start_grasp.py <file_name> [<starts> <time_budget_secs> <alpha>]")
+        return
+    file_name = sys.argv[1]
+    starts = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    time_budget = float(sys.argv[3]) if len(sys.argv) > 3 else None
+    alpha = float(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    instance = vrp_parser.main(file_name)
+    if not con_heu.check_file(instance):
+        print("File {} had problem so I skipped it".format(file_name))
+        return
+    distances = DistanceMatrix.from_instance(instance)
+    best, statistics = multi_start_grasp(instance, distances, starts, time_budget, alpha)
+    if best is None:
+        print("No GRASP start finished")
+        return
+
+    costs = np.array([result['cost'] for result in statistics])
+    print('----MULTI START GRASP----')
+    print('Starts finished: {} of {}'.format(len(statistics), starts))
+    print('Cost min/mean/max: {}/{:.1f}/{}'.format(costs.min(), costs.mean(), costs.max()))
+    print('Best start seed: ', best['seed'])
+    if not best['complete']:
+        print('No start finished in the time budget, the best start serves only part of the demand')
+    con_heu.print_results(instance, best['trucks'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+    Restricted candidate lists (RCL) for GRASP. Higher scores are better.
+
+    Cardinality based: RestrictedCandidateList keeps the best `size` candidates in a bounded min heap, so the worst
+    kept candidate is always heap[0] and each new candidate costs O(log size).
+    Value based: value_based_rcl keeps every candidate with score >= max - alpha * (max - min), found with one
+    vectorized pass over the scores.
+"""
+import heapq
+import random
+
+
+class RestrictedCandidateList:
+    def __init__(self, size):
+        self.size = size
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, node, score):
+        if len(self.heap) < self.size:
+            heapq.heappush(self.heap, (score, node))
+        elif score > self.heap[0][0]:
+            heapq.heapreplace(self.heap, (score, node))
+
+    def nodes(self):
+        return [node for score, node in self.heap]
+
+    def choice(self):
+        """ Return a random node of the list """
+        return random.choice(self.heap)[1]
+
+
+def value_based_rcl(candidates, scores, alpha):
+    """
+    :param candidates: numpy array with nodes
+    :param scores: numpy array with the score of each node
+    :param alpha: float in [0, 1], 0 keeps only the best nodes (greedy) and 1 keeps all of them (random)
+    :return: numpy array
+    """
+    if not len(candidates):
+        return candidates
+    best_score, worst_score = scores.max(), scores.min()
+    return candidates[scores >= best_score - alpha * (best_score - worst_score)]